@@ -0,0 +1,244 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import requests
+
+from .shared_state import secure_directory, write_private
+
+try:
+    import fcntl
+except ImportError:  # Windows: coalesce within the process only
+    fcntl = None
+
+class InflightRegistry:
+    """
+    Single-flight registry: concurrent calls with the same key share one
+    execution, and every caller gets its result (or exception).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """
+        Run fn() unless a call for `key` is already in flight, in which case
+        wait for it. Returns (result, coalesced).
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class CoalescingTransport:
+    """
+    Wraps an HTTP transport (the requests module, or one from api.recording)
+    so identical GET requests that overlap in time become one upstream call.
+
+    Within a process, waiters share the leader's response through an
+    InflightRegistry. When `shared_dir` is given, worker processes coalesce
+    too: a lock file elects one leader per request, and the others wait for
+    the lock and then use the response it wrote. Only responses written after
+    a waiter arrived are used, so this never serves a cached result from an
+    earlier request. Shared responses hold account data, so the directory
+    must be private to this user, and each response is deleted `result_ttl`
+    seconds after it was written. POST requests (orders) are always sent as-is.
+    """
+    LOCK_STRIPES = 256
+
+    def __init__(self, inner=None, shared_dir=None, timeout=30, result_ttl=5):
+        self.inner = inner or requests
+        self.timeout = timeout
+        self.result_ttl = result_ttl
+        self.registry = InflightRegistry()
+        self.stats = {"upstream": 0, "coalesced": 0}
+        self._lock = threading.Lock()
+        # Shared responses awaiting deletion, oldest first, and the one thread deleting them.
+        self._expiring = deque()
+        self._reaper = None
+        self.shared_dir = None
+        if shared_dir and fcntl:
+            if secure_directory(shared_dir):
+                self.shared_dir = shared_dir
+                self._sweep()
+            else:
+                print("Coalescing requests within this worker only")
+
+    def get(self, url, params=None, auth=None, **kwargs):
+        key = _request_key("GET", url, params, auth)
+        response, coalesced = self.registry.do(
+            key, lambda: self._shared(key, lambda: self.inner.get(url, params=params, auth=auth, **kwargs))
+        )
+        if coalesced:
+            self._count("coalesced")
+        return response
+
+    def post(self, url, **kwargs):
+        self._count("upstream")
+        return self.inner.post(url, **kwargs)
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _shared(self, key, send):
+        if not self.shared_dir:
+            return self._send(send)
+
+        # A fixed set of lock files (chosen by key prefix) is never deleted, so
+        # there is no race between unlinking a lock and another worker taking it.
+        stripe = int(key[:2], 16) % self.LOCK_STRIPES
+        lock_path = os.path.join(self.shared_dir, f"lock-{stripe:02x}")
+        result_path = os.path.join(self.shared_dir, f"{key}.json")
+        arrived = time.time()
+        with open(lock_path, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Another worker is fetching this; wait for it to finish.
+                if self._wait_for_lock(lock_file):
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    response = _read_response(result_path, newer_than=arrived)
+                    if response is not None:
+                        self._count("coalesced")
+                        return response
+                # Leader timed out, failed, or was fetching another request.
+                return self._send(send)
+            try:
+                response = self._send(send)
+                try:
+                    written = _write_response(result_path, response)
+                    self._remove_later(result_path, written)
+                except OSError as e:
+                    print(f"Error sharing response with other workers: {e}")
+                return response
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _wait_for_lock(self, lock_file):
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                time.sleep(0.01)
+        return False
+
+    def _send(self, send):
+        self._count("upstream")
+        response = send()
+        # Read the body now so every waiter sees the same content.
+        response.content
+        return response
+
+    def _remove_later(self, path, written):
+        """
+        Delete the response file once waiting workers have had time to read
+        it, unless a newer response has replaced it in the meantime. One
+        reaper thread serves every pending file and exits when none are left.
+        """
+        with self._lock:
+            self._expiring.append((time.monotonic() + self.result_ttl, path, written))
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap, name="coalesce-reaper", daemon=True)
+                self._reaper.start()
+
+    def _reap(self):
+        while True:
+            with self._lock:
+                if not self._expiring:
+                    self._reaper = None
+                    return
+                deadline, path, written = self._expiring[0]
+                if deadline > time.monotonic():
+                    path = None
+                else:
+                    self._expiring.popleft()
+            if path is None:
+                time.sleep(max(deadline - time.monotonic(), 0))
+                continue
+            try:
+                if os.stat(path).st_mtime_ns == written:
+                    os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def _sweep(self):
+        """
+        Delete responses (and partial writes) left behind by workers that exited
+        before removing them.
+        """
+        cutoff = time.time() - self.result_ttl
+        with os.scandir(self.shared_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith((".json", ".tmp")):
+                    continue
+                try:
+                    if entry.stat(follow_symlinks=False).st_mtime < cutoff:
+                        os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass
+
+def _request_key(method, url, params, auth):
+    # Include the access token so different sessions never share responses.
+    owner = getattr(getattr(auth, "client", None), "resource_owner_key", None)
+    raw = json.dumps([method, url, sorted((params or {}).items()), owner], default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _write_response(path, response):
+    data = {
+        "written_at": time.time(),
+        "status_code": response.status_code,
+        "headers": dict(response.headers),
+        "url": response.url,
+        "encoding": response.encoding,
+        "content": base64.b64encode(response.content or b"").decode("ascii")
+    }
+    write_private(path, json.dumps(data))
+    return os.stat(path).st_mtime_ns
+
+def _read_response(path, newer_than):
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data["written_at"] < newer_than:
+        return None
+
+    response = requests.Response()
+    response.status_code = data["status_code"]
+    response.headers.update(data["headers"])
+    response.url = data["url"]
+    response.encoding = data["encoding"]
+    response._content = base64.b64decode(data["content"])
+    return response
@@ -1,6 +1,8 @@
 import json
 from requests_oauthlib import OAuth1Session
 
+from .recording import REDACTED, open_cassette
+
 class ETradeAuth:
     def __init__(self, config_file):
         with open(config_file, 'r') as f:
@@ -11,6 +13,8 @@ class ETradeAuth:
         self.base_url = config['base_url']
         self.auth_base_url = config['auth_url']
         self.gemini_api_key = config.get('gemini_api_key')
+        # Optional record/replay of E*TRADE and Gemini traffic (see api/recording.py)
+        self.cassette = open_cassette(config.get('recording'))
 
         self.oauth_token = None
         self.oauth_token_secret = None
@@ -19,6 +23,11 @@ class ETradeAuth:
         """
         Step 1 & 2: Get request token and return authorization URL.
         """
+        if self.cassette and self.cassette.replaying:
+            # Replayed sessions never talk to E*TRADE; any verifier is accepted.
+            self.oauth_token = self.oauth_token_secret = REDACTED
+            return f"{self.auth_base_url}?key={self.consumer_key}&token={self.oauth_token}"
+
         request_token_url = f"{self.base_url}/oauth/request_token"
         oauth = OAuth1Session(self.consumer_key, client_secret=self.consumer_secret, callback_uri='oob')
 
@@ -37,6 +46,16 @@ class ETradeAuth:
         Step 3: Exchange request token and verifier for access token.
         Returns a dictionary of credentials for ETradeClient and GeminiClient.
         """
+        if self.cassette and self.cassette.replaying:
+            return {
+                "consumer_key": self.consumer_key,
+                "consumer_secret": self.consumer_secret,
+                "access_token": REDACTED,
+                "access_token_secret": REDACTED,
+                "base_url": self.base_url,
+                "gemini_api_key": self.gemini_api_key
+            }
+
         access_token_url = f"{self.base_url}/oauth/access_token"
         oauth = OAuth1Session(
             self.consumer_key,
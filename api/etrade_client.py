@@ -4,9 +4,18 @@ import json
 import time
 import random
 import string
+from datetime import date, datetime, timedelta, timezone
+
+from .tracing import span, traced
+
+class _TracedOAuth1(OAuth1):
+    # requests calls the auth object to sign each request; time the signing separately.
+    def __call__(self, r):
+        with span("etrade.oauth_sign"):
+            return super().__call__(r)
 
 class ETradeClient:
-    def __init__(self, consumer_key=None, consumer_secret=None, access_token=None, access_token_secret=None, base_url=None, credentials=None):
+    def __init__(self, consumer_key=None, consumer_secret=None, access_token=None, access_token_secret=None, base_url=None, credentials=None, transport=None):
         if credentials:
             self.consumer_key = credentials['consumer_key']
             self.consumer_secret = credentials['consumer_secret']
@@ -28,8 +37,12 @@ class ETradeClient:
             self.access_token_secret = access_token_secret
             self.base_url = base_url
 
+        # HTTP transport: the requests module itself, or a recording/replay
+        # transport from api.recording with the same get/post interface.
+        self.http = transport or requests
+
         # OAuth1 object for signing requests
-        self.auth = OAuth1(
+        self.auth = _TracedOAuth1(
             self.consumer_key,
             client_secret=self.consumer_secret,
             resource_owner_key=self.access_token,
@@ -37,21 +50,31 @@ class ETradeClient:
             signature_type='auth_header'
         )
 
+    def _send(self, method, url, **kwargs):
+        with span("etrade.http", method=method.upper()):
+            return getattr(self.http, method)(url, auth=self.auth, **kwargs)
+
+    def _parse(self, response):
+        with span("etrade.json_parse"):
+            return response.json()
+
+    @traced("etrade.list_accounts")
     def list_accounts(self):
         """
         Fetch the list of accounts for the authenticated user.
         """
         url = f"{self.base_url}/v1/accounts/list.json"
-        response = requests.get(url, auth=self.auth)
+        response = self._send("get", url)
 
         if response.status_code == 200:
-            return response.json()
+            return self._parse(response)
         elif response.status_code == 204:
             return {"AccountListResponse": {"Accounts": {"Account": []}}}
         else:
             print(f"Error listing accounts: {response.status_code} - {response.text}")
             response.raise_for_status()
 
+    @traced("etrade.get_account_balances")
     def get_account_balances(self, account_id_key, inst_type="BROKERAGE", real_time_nav=True):
         """
         Fetch balances for a specific account.
@@ -61,14 +84,15 @@ class ETradeClient:
             "instType": inst_type,
             "realTimeNAV": "true" if real_time_nav else "false"
         }
-        response = requests.get(url, auth=self.auth, params=params)
+        response = self._send("get", url, params=params)
 
         if response.status_code == 200:
-            return response.json()
+            return self._parse(response)
         else:
             print(f"Error fetching balances: {response.status_code} - {response.text}")
             response.raise_for_status()
 
+    @traced("etrade.view_portfolio")
     def view_portfolio(self, account_id_key, count=50, view="QUICK"):
         """
         Fetch portfolio positions for a specific account.
@@ -78,16 +102,17 @@ class ETradeClient:
             "count": count,
             "view": view
         }
-        response = requests.get(url, auth=self.auth, params=params)
+        response = self._send("get", url, params=params)
 
         if response.status_code == 200:
-            return response.json()
+            return self._parse(response)
         elif response.status_code == 204:
             return {"PortfolioResponse": {"AccountPortfolio": []}}
         else:
             print(f"Error fetching portfolio: {response.status_code} - {response.text}")
             response.raise_for_status()
 
+    @traced("etrade.preview_order")
     def preview_order(self, account_id_key, symbol, action, quantity, price_type="MARKET", limit_price=None):
         """
         Preview an equity order.
@@ -126,14 +151,15 @@ class ETradeClient:
         }
 
         headers = {"Content-Type": "application/json"}
-        response = requests.post(url, auth=self.auth, json=payload, headers=headers)
+        response = self._send("post", url, json=payload, headers=headers)
 
         if response.status_code == 200:
-            return response.json()
+            return self._parse(response)
         else:
             print(f"Error previewing order: {response.status_code} - {response.text}")
             response.raise_for_status()
 
+    @traced("etrade.place_order")
     def place_order(self, account_id_key, preview_id, symbol, action, quantity, price_type="MARKET", limit_price=None, client_order_id=None):
         """
         Place an equity order after it has been previewed.
@@ -178,10 +204,115 @@ class ETradeClient:
         }
 
         headers = {"Content-Type": "application/json"}
-        response = requests.post(url, auth=self.auth, json=payload, headers=headers)
+        response = self._send("post", url, json=payload, headers=headers)
 
         if response.status_code == 200:
-            return response.json()
+            return self._parse(response)
         else:
             print(f"Error placing order: {response.status_code} - {response.text}")
             response.raise_for_status()
+
+    @traced("etrade.list_orders")
+    def list_orders(self, account_id_key, marker=None, count=100, status=None, from_date=None, to_date=None, symbol=None):
+        """
+        Fetch one page of orders for a specific account.
+        Dates are datetime.date objects; pass the returned marker to get the next page.
+        """
+        url = f"{self.base_url}/v1/accounts/{account_id_key}/orders.json"
+        params = {"count": count}
+        if marker:
+            params["marker"] = marker
+        if status:
+            params["status"] = status
+        if from_date:
+            params["fromDate"] = from_date.strftime("%m%d%Y")
+        if to_date:
+            params["toDate"] = to_date.strftime("%m%d%Y")
+        if symbol:
+            params["symbol"] = symbol
+        response = self._send("get", url, params=params)
+
+        if response.status_code == 200:
+            return self._parse(response)
+        elif response.status_code == 204:
+            return {"OrdersResponse": {"Order": []}}
+        else:
+            print(f"Error listing orders: {response.status_code} - {response.text}")
+            response.raise_for_status()
+
+    @traced("etrade.list_transactions")
+    def list_transactions(self, account_id_key, marker=None, count=50, start_date=None, end_date=None):
+        """
+        Fetch one page of transactions for a specific account.
+        Dates are datetime.date objects; pass the returned marker to get the next page.
+        """
+        url = f"{self.base_url}/v1/accounts/{account_id_key}/transactions.json"
+        params = {"count": count}
+        if marker:
+            params["marker"] = marker
+        if start_date:
+            params["startDate"] = start_date.strftime("%m%d%Y")
+        if end_date:
+            params["endDate"] = end_date.strftime("%m%d%Y")
+        response = self._send("get", url, params=params)
+
+        if response.status_code == 200:
+            return self._parse(response)
+        elif response.status_code == 204:
+            return {"TransactionListResponse": {"Transaction": []}}
+        else:
+            print(f"Error listing transactions: {response.status_code} - {response.text}")
+            response.raise_for_status()
+
+    def iter_orders(self, account_id_key, **kwargs):
+        """
+        Yield every order matching the filters, following pagination markers.
+        """
+        marker = None
+        while True:
+            page = self.list_orders(account_id_key, marker=marker, **kwargs).get("OrdersResponse", {})
+            yield from page.get("Order", [])
+            marker = page.get("marker")
+            if not marker:
+                return
+
+    def iter_transactions(self, account_id_key, **kwargs):
+        """
+        Yield every transaction matching the filters, following pagination markers.
+        """
+        marker = None
+        while True:
+            page = self.list_transactions(account_id_key, marker=marker, **kwargs).get("TransactionListResponse", {})
+            yield from page.get("Transaction", [])
+            marker = page.get("marker")
+            if not marker or not page.get("moreTransactions", True):
+                return
+
+    @traced("etrade.sync_orders")
+    def sync_orders(self, account_id_key, store):
+        """
+        Pull orders newer than the store's high-water mark into the local history store.
+        Returns the number of orders written.
+        """
+        from_date = _date_from_millis(store.get_high_water_mark("orders", account_id_key))
+        to_date = date.today() if from_date else None
+        orders = list(self.iter_orders(account_id_key, from_date=from_date, to_date=to_date))
+        return store.upsert_orders(account_id_key, orders)
+
+    @traced("etrade.sync_transactions")
+    def sync_transactions(self, account_id_key, store):
+        """
+        Pull transactions newer than the store's high-water mark into the local history store.
+        Returns the number of transactions written.
+        """
+        start_date = _date_from_millis(store.get_high_water_mark("transactions", account_id_key))
+        end_date = date.today() if start_date else None
+        transactions = list(self.iter_transactions(account_id_key, start_date=start_date, end_date=end_date))
+        return store.upsert_transactions(account_id_key, transactions)
+
+def _date_from_millis(millis):
+    # E*TRADE filters by calendar day in US Eastern time; start a day early so a
+    # UTC/Eastern date mismatch can't skip records. Overlap is deduplicated by the store.
+    if millis is None:
+        return None
+    return datetime.fromtimestamp(millis / 1000, tz=timezone.utc).date() - timedelta(days=1)
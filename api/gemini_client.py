@@ -1,15 +1,32 @@
-from google import genai
+from .tracing import span, traced
 
 class GeminiClient:
-    def __init__(self, api_key):
-        self.client = genai.Client(api_key=api_key)
+    def __init__(self, api_key, cassette=None):
+        if cassette and cassette.replaying:
+            # Served entirely from the cassette; no SDK or API key needed.
+            from .recording import ReplayGeminiClient
+            self.client = ReplayGeminiClient(cassette)
+        else:
+            # Imported here rather than at module level: the google.genai SDK is
+            # heavy and only needed once chat is actually used.
+            from google import genai
+
+            self.client = genai.Client(api_key=api_key)
+            if cassette:
+                from .recording import RecordingGeminiClient
+                self.client = RecordingGeminiClient(self.client, cassette)
         self.model_id = 'gemini-2.0-flash'
 
     def analyze_portfolio(self, portfolio_data):
         """
         Perform a general analysis of the portfolio data.
         """
-        prompt = f"""
+        with span("gemini.build_prompt"):
+            prompt = self._analysis_prompt(portfolio_data)
+        return self._generate(prompt)
+
+    def _analysis_prompt(self, portfolio_data):
+        return f"""
         Analyze the following E*TRADE portfolio data:
         {portfolio_data}
 
@@ -21,13 +38,17 @@ class GeminiClient:
 
         Format the output clearly for a human reader.
         """
-        return self._generate(prompt)
 
     def chat(self, portfolio_data, user_question):
         """
         Answer a specific user question about the portfolio data.
         """
-        prompt = f"""
+        with span("gemini.build_prompt"):
+            prompt = self._chat_prompt(portfolio_data, user_question)
+        return self._generate(prompt)
+
+    def _chat_prompt(self, portfolio_data, user_question):
+        return f"""
         You are a financial assistant. Below is the user's E*TRADE portfolio data:
         {portfolio_data}
 
@@ -36,8 +57,8 @@ class GeminiClient:
 
         Please provide a helpful, data-driven answer based on the portfolio information and your general knowledge of the market and companies involved.
         """
-        return self._generate(prompt)
 
+    @traced("gemini.generate_content")
     def _generate(self, prompt):
         try:
             response = self.client.models.generate_content(
@@ -0,0 +1,211 @@
+import json
+import sqlite3
+import threading
+import time
+
+# Order statuses that can still change upstream. Orders in these states keep the
+# orders high-water mark from moving past them so the next sync refreshes them.
+OPEN_ORDER_STATUSES = ("OPEN", "PARTIAL", "CANCEL_REQUESTED")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    account_id_key TEXT NOT NULL,
+    order_id INTEGER NOT NULL,
+    symbol TEXT,
+    action TEXT,
+    quantity REAL,
+    filled_quantity REAL,
+    price_type TEXT,
+    status TEXT,
+    placed_time INTEGER,
+    executed_time INTEGER,
+    raw TEXT NOT NULL,
+    PRIMARY KEY (account_id_key, order_id)
+);
+CREATE INDEX IF NOT EXISTS idx_orders_symbol ON orders (account_id_key, symbol, placed_time);
+CREATE INDEX IF NOT EXISTS idx_orders_placed ON orders (account_id_key, placed_time);
+CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (account_id_key, status, placed_time);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    account_id_key TEXT NOT NULL,
+    transaction_id TEXT NOT NULL,
+    symbol TEXT,
+    transaction_type TEXT,
+    transaction_date INTEGER,
+    amount REAL,
+    description TEXT,
+    raw TEXT NOT NULL,
+    PRIMARY KEY (account_id_key, transaction_id)
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_symbol ON transactions (account_id_key, symbol, transaction_date);
+CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (account_id_key, transaction_date);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    kind TEXT NOT NULL,
+    account_id_key TEXT NOT NULL,
+    high_water_mark INTEGER,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (kind, account_id_key)
+);
+"""
+
+class HistoryStore:
+    """
+    Local SQLite index of order and transaction history, keyed per account.
+    Records are flattened into indexed columns (symbol, date, status) and the
+    original E*TRADE payload is kept alongside so queries return full detail.
+    """
+    def __init__(self, path="history.db"):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        if path != ":memory:":
+            # Lets several worker processes read while one is syncing.
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def get_high_water_mark(self, kind, account_id_key):
+        """
+        Return the epoch-millis timestamp the next sync of `kind` ("orders" or
+        "transactions") should resume from, or None if the account was never synced.
+        """
+        row = self._fetchone(
+            "SELECT high_water_mark FROM sync_state WHERE kind = ? AND account_id_key = ?",
+            (kind, account_id_key)
+        )
+        return row["high_water_mark"] if row else None
+
+    def last_synced(self, kind, account_id_key):
+        row = self._fetchone(
+            "SELECT synced_at FROM sync_state WHERE kind = ? AND account_id_key = ?",
+            (kind, account_id_key)
+        )
+        return row["synced_at"] if row else None
+
+    def upsert_orders(self, account_id_key, orders, update_sync_state=True):
+        """
+        Insert or refresh orders. Pass update_sync_state=False when writing
+        orders that did not come from a full sync (e.g. status polling), so the
+        account still gets its initial sync.
+        """
+        rows = [_order_row(account_id_key, order) for order in orders]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """INSERT OR REPLACE INTO orders
+                   (account_id_key, order_id, symbol, action, quantity, filled_quantity,
+                    price_type, status, placed_time, executed_time, raw)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                rows
+            )
+            if not update_sync_state:
+                return len(rows)
+            # Resume from the oldest order that can still change, otherwise from the newest one seen.
+            placeholders = ",".join("?" * len(OPEN_ORDER_STATUSES))
+            mark = self._conn.execute(
+                f"""SELECT COALESCE(
+                        (SELECT MIN(placed_time) FROM orders WHERE account_id_key = ? AND status IN ({placeholders})),
+                        (SELECT MAX(placed_time) FROM orders WHERE account_id_key = ?))""",
+                (account_id_key, *OPEN_ORDER_STATUSES, account_id_key)
+            ).fetchone()[0]
+            self._set_sync_state("orders", account_id_key, mark)
+        return len(rows)
+
+    def upsert_transactions(self, account_id_key, transactions):
+        rows = [_transaction_row(account_id_key, txn) for txn in transactions]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """INSERT OR REPLACE INTO transactions
+                   (account_id_key, transaction_id, symbol, transaction_type,
+                    transaction_date, amount, description, raw)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                rows
+            )
+            mark = self._conn.execute(
+                "SELECT MAX(transaction_date) FROM transactions WHERE account_id_key = ?",
+                (account_id_key,)
+            ).fetchone()[0]
+            self._set_sync_state("transactions", account_id_key, mark)
+        return len(rows)
+
+    def query_orders(self, account_id_key, symbol=None, status=None, start=None, end=None, limit=100):
+        """
+        Return stored orders, newest first. `start`/`end` are epoch millis bounds on placed time.
+        """
+        where, params = _filters(account_id_key, "placed_time", symbol, start, end)
+        if status:
+            where.append("status = ?")
+            params.append(status)
+        return self._query("orders", where, params, "placed_time", limit)
+
+    def query_transactions(self, account_id_key, symbol=None, start=None, end=None, limit=100):
+        """
+        Return stored transactions, newest first. `start`/`end` are epoch millis bounds on transaction date.
+        """
+        where, params = _filters(account_id_key, "transaction_date", symbol, start, end)
+        return self._query("transactions", where, params, "transaction_date", limit)
+
+    def _set_sync_state(self, kind, account_id_key, mark):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sync_state (kind, account_id_key, high_water_mark, synced_at) VALUES (?, ?, ?, ?)",
+            (kind, account_id_key, mark, time.time())
+        )
+
+    def _query(self, table, where, params, order_column, limit):
+        sql = f"SELECT raw FROM {table} WHERE {' AND '.join(where)} ORDER BY {order_column} DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(sql, (*params, limit)).fetchall()
+        return [json.loads(row["raw"]) for row in rows]
+
+    def _fetchone(self, sql, params):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+def _filters(account_id_key, date_column, symbol, start, end):
+    where, params = ["account_id_key = ?"], [account_id_key]
+    if symbol:
+        where.append("symbol = ?")
+        params.append(symbol.upper())
+    if start is not None:
+        where.append(f"{date_column} >= ?")
+        params.append(start)
+    if end is not None:
+        where.append(f"{date_column} < ?")
+        params.append(end)
+    return where, params
+
+def _order_row(account_id_key, order):
+    detail = (order.get("OrderDetail") or [{}])[0]
+    instrument = (detail.get("Instrument") or [{}])[0]
+    symbol = instrument.get("Product", {}).get("symbol")
+    return (
+        account_id_key,
+        order.get("orderId"),
+        symbol.upper() if symbol else None,
+        instrument.get("orderAction"),
+        instrument.get("orderedQuantity", instrument.get("quantity")),
+        instrument.get("filledQuantity"),
+        detail.get("priceType"),
+        detail.get("status"),
+        detail.get("placedTime"),
+        detail.get("executedTime"),
+        json.dumps(order)
+    )
+
+def _transaction_row(account_id_key, txn):
+    brokerage = txn.get("Brokerage", {})
+    # E*TRADE has returned both "Product" and "product" here.
+    product = brokerage.get("Product") or brokerage.get("product") or {}
+    symbol = product.get("symbol") or brokerage.get("displaySymbol")
+    return (
+        account_id_key,
+        str(txn.get("transactionId")),
+        symbol.upper() if symbol else None,
+        txn.get("transactionType"),
+        txn.get("transactionDate"),
+        txn.get("amount"),
+        txn.get("description"),
+        json.dumps(txn)
+    )
@@ -0,0 +1,212 @@
+import asyncio
+import threading
+import time
+from datetime import date, timedelta
+
+# (max order age in seconds, poll interval in seconds). Fresh orders are polled
+# often since market orders usually fill within seconds; older ones back off.
+POLL_SCHEDULE = [(60, 2), (600, 10), (3600, 30)]
+DEFAULT_POLL_INTERVAL = 120
+
+# Stop tracking after a day; GOOD_FOR_DAY orders have expired by then.
+MAX_TRACKED_AGE = 24 * 3600
+
+FILL_STATUSES = ("EXECUTED",)
+PARTIAL_STATUSES = ("PARTIAL", "INDIVIDUAL_FILLS")
+CANCEL_STATUSES = ("CANCELLED", "REJECTED", "EXPIRED")
+
+def poll_interval(age):
+    for max_age, interval in POLL_SCHEDULE:
+        if age < max_age:
+            return interval
+    return DEFAULT_POLL_INTERVAL
+
+class TrackedOrder:
+    def __init__(self, account_id_key, order_id, symbol=None):
+        self.account_id_key = account_id_key
+        self.order_id = order_id
+        self.symbol = symbol
+        self.status = None
+        self.filled_quantity = 0
+        self.registered_at = time.monotonic()
+        self.registered_on = date.today()
+        self.next_poll = self.registered_at + poll_interval(0)
+
+    def age(self, now):
+        return now - self.registered_at
+
+    def update(self, order):
+        """
+        Apply an order record from list_orders. Returns an event dict if the
+        status or filled quantity changed, otherwise None.
+        """
+        detail = (order.get("OrderDetail") or [{}])[0]
+        instrument = (detail.get("Instrument") or [{}])[0]
+        status = detail.get("status")
+        filled = instrument.get("filledQuantity") or 0
+
+        if status == self.status and filled == self.filled_quantity:
+            return None
+        self.status = status
+        self.filled_quantity = filled
+        self.symbol = self.symbol or instrument.get("Product", {}).get("symbol")
+
+        if status in FILL_STATUSES:
+            event_type = "fill"
+        elif status in CANCEL_STATUSES:
+            event_type = "cancel"
+        elif status in PARTIAL_STATUSES or filled:
+            event_type = "partial_fill"
+        else:
+            event_type = "status"
+
+        return {
+            "type": event_type,
+            "accountIdKey": self.account_id_key,
+            "orderId": self.order_id,
+            "symbol": self.symbol,
+            "status": status,
+            "filledQuantity": filled,
+            # Positions and cash only change when shares actually trade.
+            "invalidate": ["portfolio", "balance"] if event_type in ("fill", "partial_fill") else []
+        }
+
+    @property
+    def done(self):
+        return self.status in FILL_STATUSES + CANCEL_STATUSES
+
+class OrderTracker:
+    """
+    Tracks placed orders until they fill or are cancelled.
+
+    A background thread polls E*TRADE with one list of orders per account
+    covering every tracked order in it, on an interval that grows with order
+    age. Status changes are pushed to subscribers (see subscribe) and written
+    to the history store when one is configured.
+    """
+    def __init__(self, get_client, get_store=None):
+        self._get_client = get_client
+        self._get_store = get_store
+        self._orders = {}
+        self._subscribers = []
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def register(self, account_id_key, order_id, symbol=None):
+        with self._cond:
+            self._orders[(account_id_key, order_id)] = TrackedOrder(account_id_key, order_id, symbol)
+            self._ensure_thread()
+            self._cond.notify()
+
+    def tracked(self):
+        with self._cond:
+            return list(self._orders.values())
+
+    def subscribe(self):
+        """
+        Return an asyncio.Queue that receives order events. Must be called from
+        the event loop that will consume the queue.
+        """
+        queue = asyncio.Queue()
+        with self._cond:
+            self._subscribers.append((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._cond:
+            self._subscribers = [(loop, q) for loop, q in self._subscribers if q is not queue]
+
+    def poll_account(self, account_id_key):
+        """
+        Refresh every tracked order for one account with one paged list of
+        its orders, stopping as soon as every tracked order has been seen.
+        Returns the events emitted.
+        """
+        client = self._get_client()
+        with self._cond:
+            tracked = [o for o in self._orders.values() if o.account_id_key == account_id_key]
+        if not tracked:
+            return []
+
+        orders = {}
+        wanted = {o.order_id for o in tracked}
+        try:
+            if client:
+                # Usually the first page covers every tracked order; keep paging only until all are found.
+                for order in client.iter_orders(
+                    account_id_key,
+                    from_date=min(o.registered_on for o in tracked) - timedelta(days=1),
+                    to_date=date.today()
+                ):
+                    if order.get("orderId") in wanted:
+                        orders[order["orderId"]] = order
+                        if len(orders) == len(wanted):
+                            break
+        except Exception as e:
+            print(f"Error polling orders for {account_id_key}: {e}")
+
+        events, changed = [], []
+        now = time.monotonic()
+        with self._cond:
+            for tracked_order in tracked:
+                order = orders.get(tracked_order.order_id)
+                event = tracked_order.update(order) if order else None
+                if event:
+                    events.append(event)
+                    changed.append(order)
+                if tracked_order.done or tracked_order.age(now) > MAX_TRACKED_AGE:
+                    if not tracked_order.done:
+                        print(f"Stopped tracking order {tracked_order.order_id} after {MAX_TRACKED_AGE}s "
+                              f"(last status: {tracked_order.status})")
+                    self._orders.pop((account_id_key, tracked_order.order_id), None)
+                else:
+                    tracked_order.next_poll = now + poll_interval(tracked_order.age(now))
+            subscribers = list(self._subscribers)
+
+        # Events first: the orders above already hold the new status, so an event
+        # that isn't sent now is never sent.
+        for event in events:
+            for loop, queue in subscribers:
+                try:
+                    loop.call_soon_threadsafe(queue.put_nowait, event)
+                except RuntimeError:
+                    # The subscriber's event loop has closed.
+                    self.unsubscribe(queue)
+        if changed and self._get_store:
+            try:
+                self._get_store().upsert_orders(account_id_key, changed, update_sync_state=False)
+            except Exception as e:
+                # The next history sync picks these orders up again.
+                print(f"Error saving orders for {account_id_key}: {e}")
+        return events
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="order-tracker", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._orders:
+                    self._cond.wait()
+                now = time.monotonic()
+                next_poll = min(o.next_poll for o in self._orders.values())
+                if next_poll > now:
+                    self._cond.wait(next_poll - now)
+                    continue
+                due = {o.account_id_key for o in self._orders.values() if o.next_poll <= now}
+            for account_id_key in due:
+                try:
+                    self.poll_account(account_id_key)
+                except Exception as e:
+                    # Keep the thread alive for the other orders; retry this account later.
+                    print(f"Error tracking orders for {account_id_key}: {e}")
+                    self._postpone(account_id_key)
+
+    def _postpone(self, account_id_key):
+        with self._cond:
+            now = time.monotonic()
+            for o in self._orders.values():
+                if o.account_id_key == account_id_key and o.next_poll <= now:
+                    o.next_poll = now + poll_interval(o.age(now))
@@ -0,0 +1,307 @@
+import atexit
+import errno
+import glob
+import gzip
+import json
+import os
+import threading
+import time
+import zlib
+from urllib.parse import urlsplit
+
+import requests
+
+# Values stored under these keys (in params, request bodies or responses) are
+# replaced before anything is written to a cassette.
+SENSITIVE_KEYS = {
+    "oauth_token", "oauth_token_secret", "oauth_verifier", "oauth_consumer_key",
+    "consumer_key", "consumer_secret", "access_token", "access_token_secret",
+    "api_key", "gemini_api_key", "key", "token"
+}
+REDACTED = "REDACTED"
+
+# Fields that change on every call, or with the day the request is made (date
+# windows derived from date.today()), and must not take part in request matching.
+VOLATILE_KEYS = {"clientOrderId", "fromDate", "toDate", "startDate", "endDate"}
+
+class CassetteMiss(LookupError):
+    pass
+
+class CorruptCassette(ValueError):
+    pass
+
+class Cassette:
+    """
+    Recorded E*TRADE and Gemini interactions, stored one JSON object per line
+    (gzip-compressed when the path ends in .gz).
+
+    In "record" mode, traffic goes to the real services and each exchange is
+    written with credentials redacted. Every recording session (each process,
+    each restart) writes its own file next to `path`, named
+    <name>.<start time>-<pid>.jsonl[.gz], so concurrent workers and sessions
+    that ended without closing their gzip stream never share a file. In
+    "replay" mode, nothing touches the network: responses are served from
+    `path` and those session files, optionally after sleeping for the recorded
+    duration so latency matches the original run.
+    """
+    def __init__(self, path, mode="replay", realtime=True):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown recording mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.realtime = realtime
+        self._lock = threading.Lock()
+        self._interactions = {}
+        self._cursors = {}
+        self._writer = None
+        self.session_path = None
+        if mode == "replay":
+            self._load()
+
+    @property
+    def replaying(self):
+        return self.mode == "replay"
+
+    def http_transport(self):
+        """
+        Return an object with requests-style get/post for ETradeClient.
+        """
+        return ReplayTransport(self) if self.replaying else RecordingTransport(self)
+
+    def record(self, service, method, path, params, body, status, headers, response, elapsed):
+        interaction = {
+            "service": service,
+            "method": method,
+            "path": path,
+            "params": redact(params),
+            "body": redact(body),
+            "status": status,
+            "headers": headers,
+            "response": redact(response),
+            "elapsed": round(elapsed, 4)
+        }
+        line = json.dumps(interaction, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._writer is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                # One writer (one gzip stream) per session so compression spans all
+                # interactions. Closed at exit; flushed per line so a crash loses nothing.
+                self._writer = self._open_session()
+                atexit.register(self.close)
+            self._writer.write(line)
+            self._writer.flush()
+
+    def _open_session(self):
+        root, ext = _split_path(self.path)
+        while True:
+            self.session_path = f"{root}.{time.time_ns()}-{os.getpid()}{ext}"
+            try:
+                return _open(self.session_path, "xt")
+            except FileExistsError:
+                continue
+
+    def close(self):
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    def play(self, service, method, path, params, body):
+        """
+        Return the recorded interaction for a request. Repeated identical
+        requests are served in recorded order, repeating the last one once
+        the recording runs out.
+        """
+        key = _match_key(service, method, path, redact(params), redact(body))
+        with self._lock:
+            candidates = self._interactions.get(key)
+            if not candidates:
+                raise CassetteMiss(f"No recorded {service} interaction for {method} {path}")
+            index = self._cursors.get(key, 0)
+            self._cursors[key] = index + 1
+            interaction = candidates[min(index, len(candidates) - 1)]
+        if self.realtime:
+            time.sleep(interaction["elapsed"])
+        return interaction
+
+    def _load(self):
+        root, ext = _split_path(self.path)
+        sessions = sorted(glob.glob(f"{glob.escape(root)}.*-*{ext}"))
+        paths = ([self.path] if os.path.exists(self.path) else []) + sessions
+        if not paths:
+            raise FileNotFoundError(errno.ENOENT, "No cassette recorded", self.path)
+        for path in paths:
+            try:
+                for line in _read_lines(path):
+                    if not line.strip():
+                        continue
+                    interaction = json.loads(line)
+                    key = _match_key(
+                        interaction["service"], interaction["method"], interaction["path"],
+                        interaction["params"], interaction["body"]
+                    )
+                    self._interactions.setdefault(key, []).append(interaction)
+            except (OSError, zlib.error, ValueError, KeyError, TypeError) as e:
+                raise CorruptCassette(f"Cassette {path} is unreadable ({type(e).__name__}: {e})") from e
+
+class RecordingTransport:
+    """
+    Sends requests with the `requests` library and records each exchange.
+    """
+    def __init__(self, cassette):
+        self.cassette = cassette
+
+    def get(self, url, **kwargs):
+        return self._send("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self._send("POST", url, **kwargs)
+
+    def _send(self, method, url, params=None, json=None, **kwargs):
+        start = time.perf_counter()
+        response = requests.request(method, url, params=params, json=json, **kwargs)
+        elapsed = time.perf_counter() - start
+
+        content_type = response.headers.get("Content-Type", "")
+        try:
+            body = response.json() if "json" in content_type else response.text
+        except ValueError:
+            body = response.text
+        self.cassette.record(
+            "etrade", method, urlsplit(url).path, params, json,
+            response.status_code, {"Content-Type": content_type}, body, elapsed
+        )
+        return response
+
+class ReplayTransport:
+    """
+    Serves recorded responses as `requests.Response` objects without network access.
+    """
+    def __init__(self, cassette):
+        self.cassette = cassette
+
+    def get(self, url, **kwargs):
+        return self._send("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self._send("POST", url, **kwargs)
+
+    def _send(self, method, url, params=None, json=None, **kwargs):
+        interaction = self.cassette.play("etrade", method, urlsplit(url).path, params, json)
+        body = interaction["response"]
+
+        response = requests.Response()
+        response.status_code = interaction["status"]
+        response.headers.update(interaction["headers"])
+        response.url = url
+        response.encoding = "utf-8"
+        response._content = (body if isinstance(body, str) else _json_dumps(body)).encode("utf-8")
+        return response
+
+class RecordingGeminiClient:
+    """
+    Wraps a google.genai client so generate_content calls are recorded.
+    """
+    def __init__(self, client, cassette):
+        self.models = _RecordingModels(client.models, cassette)
+
+class ReplayGeminiClient:
+    """
+    Stands in for a google.genai client, answering generate_content from a cassette.
+    """
+    def __init__(self, cassette):
+        self.models = _ReplayModels(cassette)
+
+class _RecordingModels:
+    def __init__(self, models, cassette):
+        self._models = models
+        self._cassette = cassette
+
+    def generate_content(self, model, contents):
+        start = time.perf_counter()
+        response = self._models.generate_content(model=model, contents=contents)
+        self._cassette.record(
+            "gemini", "generate_content", model, None, {"contents": contents},
+            200, {}, response.text, time.perf_counter() - start
+        )
+        return response
+
+class _ReplayModels:
+    def __init__(self, cassette):
+        self._cassette = cassette
+
+    def generate_content(self, model, contents):
+        interaction = self._cassette.play("gemini", "generate_content", model, None, {"contents": contents})
+        return _ReplayedGeminiResponse(interaction["response"])
+
+class _ReplayedGeminiResponse:
+    def __init__(self, text):
+        self.text = text
+
+_cassettes = {}
+_cassettes_lock = threading.Lock()
+
+def open_cassette(recording_config):
+    """
+    Build (or reuse) the cassette described by the "recording" block of a
+    config_*.json file, e.g.
+        {"mode": "replay", "cassette": "cassettes/sandbox.jsonl.gz", "realtime": true}
+    Returns None when recording is not configured.
+    """
+    if not recording_config:
+        return None
+    path = recording_config["cassette"]
+    mode = recording_config.get("mode", "replay")
+    realtime = recording_config.get("realtime", True)
+    with _cassettes_lock:
+        key = (path, mode, realtime)
+        if key not in _cassettes:
+            _cassettes[key] = Cassette(path, mode, realtime)
+        return _cassettes[key]
+
+def redact(value):
+    if isinstance(value, dict):
+        return {k: REDACTED if k in SENSITIVE_KEYS else redact(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [redact(v) for v in value]
+    return value
+
+def _strip_volatile(value):
+    if isinstance(value, dict):
+        return {k: _strip_volatile(v) for k, v in value.items() if k not in VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [_strip_volatile(v) for v in value]
+    return value
+
+def _match_key(service, method, path, params, body):
+    return _json_dumps([service, method, path, _strip_volatile(params), _strip_volatile(body)])
+
+def _json_dumps(value):
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+
+def _split_path(path):
+    """
+    Split a cassette path into its name and extension, keeping .jsonl.gz whole.
+    """
+    compressed = path.endswith(".gz")
+    root, ext = os.path.splitext(path[:-3] if compressed else path)
+    return root, ext + (".gz" if compressed else "")
+
+def _read_lines(path):
+    lines = []
+    with _open(path, "rt") as f:
+        try:
+            for line in f:
+                lines.append(line)
+        except EOFError:
+            # A recording session that is still running (or was killed) has no
+            # gzip trailer yet; everything flushed before that point is usable.
+            pass
+    return lines
+
+def _open(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode, encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
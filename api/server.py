@@ -1,15 +1,139 @@
-from fastapi import FastAPI, HTTPException, Body
+from fastapi import FastAPI, HTTPException, Body, Request, Header, Depends, BackgroundTasks
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel
+from datetime import date, datetime, timedelta, timezone
 import os
 import json
+import asyncio
+import hmac
+import threading
+import time
 
 from .etrade_auth import ETradeAuth
 from .etrade_client import ETradeClient
 from .gemini_client import GeminiClient
+from .history_store import HistoryStore
+from .order_tracker import OrderTracker
+from .recording import Cassette, CorruptCassette
+from .coalescing import CoalescingTransport
+from .tracing import TraceBuffer, SamplingProfiler, TracingMiddleware, span
+from .shared_state import SessionStore, secure_directory
+
+# Simple in-memory state management. With several workers, the login session
+# is mirrored through a SessionStore in SHARED_STATE_DIR (see sync_session).
+class AppState:
+    def __init__(self):
+        self.auth: Optional[ETradeAuth] = None
+        self.client: Optional[ETradeClient] = None
+        self.gemini: Optional[GeminiClient] = None
+        self.env: str = "sandbox"
+        self.gemini_api_key: Optional[str] = None
+        self.history: Optional[HistoryStore] = None
+        self.cassette: Optional[Cassette] = None
+        self.credentials: Optional[Dict[str, Any]] = None
+        self.session_version: Optional[int] = None
 
-app = FastAPI(title="E*TRADE API Service")
+state = AppState()
+
+def _session_store() -> Optional[SessionStore]:
+    directory = os.environ.get("SHARED_STATE_DIR")
+    if directory and secure_directory(directory):
+        return SessionStore(directory)
+    return None
+
+sessions = _session_store()
+
+def connect(credentials, cassette):
+    # Identical concurrent GETs (several tabs loading at once) share one upstream
+    # call; with a shared session, workers share the same token and can coalesce too.
+    transport = CoalescingTransport(
+        cassette.http_transport() if cassette else None,
+        shared_dir=os.path.join(sessions.directory, "coalesce") if sessions else None
+    )
+    state.client = ETradeClient(credentials, transport=transport)
+    state.credentials = credentials
+    state.cassette = cassette
+    state.gemini = None
+    state.gemini_api_key = credentials.get("gemini_api_key")
+
+def save_session():
+    if not sessions:
+        return
+    session = {"env": state.env, "credentials": state.credentials}
+    if state.auth:
+        session["request_token"] = [state.auth.oauth_token, state.auth.oauth_token_secret]
+    state.session_version = sessions.save(session)
+
+def sync_session():
+    """
+    Pick up a login made by another worker. Runs before every request and
+    costs one stat() call when nothing changed.
+    """
+    if not sessions:
+        return
+    version = sessions.version()
+    if version is None or version == state.session_version:
+        return
+    session = sessions.load()
+    if not session:
+        return
+
+    state.session_version = version
+    try:
+        auth = ETradeAuth(f"config_{session['env']}.json")
+    except Exception as e:
+        print(f"Error loading shared session: {e}")
+        return
+    auth.oauth_token, auth.oauth_token_secret = session.get("request_token") or (None, None)
+    state.env = session["env"]
+    state.auth = auth
+    if session.get("credentials"):
+        connect(session["credentials"], auth.cassette)
+
+# History queries are served locally; older than this (seconds) triggers an
+# incremental sync of new records first.
+HISTORY_MAX_AGE = float(os.environ.get("HISTORY_MAX_AGE", 60))
+
+def get_history_store() -> HistoryStore:
+    if not state.history:
+        state.history = HistoryStore(os.environ.get("HISTORY_DB", "history.db"))
+    return state.history
+
+# (kind, account) pairs with a background history sync in flight.
+_history_syncs = set()
+_history_syncs_lock = threading.Lock()
+
+def _refresh_history(store: HistoryStore, kind: str, account_id_key: str, background_tasks: BackgroundTasks):
+    """
+    Sync `kind` ("orders" or "transactions") for an account so queries can be
+    answered from the local index. Only the first query for an account waits
+    for the sync; when the index is merely stale, the query is answered right
+    away and one incremental sync per account runs in the background.
+    """
+    synced_at = store.last_synced(kind, account_id_key)
+    if synced_at is None:
+        getattr(state.client, f"sync_{kind}")(account_id_key, store)
+        return
+    if time.time() - synced_at <= HISTORY_MAX_AGE:
+        return
+    with _history_syncs_lock:
+        if (kind, account_id_key) in _history_syncs:
+            return
+        _history_syncs.add((kind, account_id_key))
+    background_tasks.add_task(_sync_history, state.client, store, kind, account_id_key)
+
+def _sync_history(client: ETradeClient, store: HistoryStore, kind: str, account_id_key: str):
+    try:
+        getattr(client, f"sync_{kind}")(account_id_key, store)
+    except Exception as e:
+        print(f"Error syncing {kind} for {account_id_key}: {e}")
+    finally:
+        with _history_syncs_lock:
+            _history_syncs.discard((kind, account_id_key))
+
+app = FastAPI(title="E*TRADE API Service", dependencies=[Depends(sync_session)])
 
 # Enable CORS for React frontend
 app.add_middleware(
@@ -18,18 +142,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id"],
 )
 
-# Simple in-memory state management
-class AppState:
-    def __init__(self):
-        self.auth: Optional[ETradeAuth] = None
-        self.client: Optional[ETradeClient] = None
-        self.gemini: Optional[GeminiClient] = None
-        self.env: str = "sandbox"
-        self.gemini_api_key: Optional[str] = None
+# Opt-in tracing: send "X-Trace: 1" on a request, or start the sampling
+# profiler via /admin/profile to trace every request for a while. With a
+# shared session, traces and profiles are shared by all workers too.
+def _tracing_dir() -> Optional[str]:
+    if not sessions:
+        return None
+    directory = os.path.join(sessions.directory, "tracing")
+    return directory if secure_directory(directory) else None
 
-state = AppState()
+traces = TraceBuffer(directory=_tracing_dir())
+profiler = SamplingProfiler(directory=traces.directory)
+app.add_middleware(TracingMiddleware, buffer=traces, profiler=profiler)
+
+tracker = OrderTracker(lambda: state.client, get_history_store)
+
+def _to_millis(day: Optional[date]) -> Optional[int]:
+    if day is None:
+        return None
+    return int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp() * 1000)
 
 class AuthRequest(BaseModel):
     env: str = "sandbox"
@@ -56,6 +190,17 @@ class ChatRequest(BaseModel):
     accountIdKey: str
     message: str
 
+class ProfileRequest(BaseModel):
+    seconds: float = 10
+    interval: float = 0.005
+
+def require_admin(token: Optional[str]):
+    expected = os.environ.get("ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled (set ADMIN_TOKEN)")
+    if token is None or not hmac.compare_digest(token.encode("utf-8"), expected.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
 @app.get("/status")
 def get_status():
     return {
@@ -70,8 +215,14 @@ def initialize_auth(req: AuthRequest):
     if not os.path.exists(config_file):
         raise HTTPException(status_code=404, detail=f"Config file {config_file} not found")
 
-    state.auth = ETradeAuth(config_file)
+    try:
+        state.auth = ETradeAuth(config_file)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=f"Replay cassette {e.filename} not found (see 'recording' in {config_file})")
+    except CorruptCassette as e:
+        raise HTTPException(status_code=422, detail=str(e))
     url = state.auth.get_authorization_url()
+    save_session()
     return {"authorization_url": url}
 
 @app.post("/auth/verify")
@@ -81,8 +232,8 @@ def verify_auth(req: VerifierRequest):
 
     try:
         credentials = state.auth.get_access_token(req.verifier)
-        state.client = ETradeClient(credentials)
-        state.gemini_api_key = credentials.get("gemini_api_key")
+        connect(credentials, state.auth.cassette)
+        save_session()
         return {"status": "success", "message": "Successfully authenticated with E*TRADE"}
     except Exception as e:
         raise HTTPException(status_code=401, detail=str(e))
@@ -113,6 +264,48 @@ def get_portfolio(account_id_key: str):
     portfolio = state.client.view_portfolio(account_id_key)
     return {"portfolio": portfolio}
 
+@app.post("/accounts/{account_id_key}/history/sync")
+def sync_history(account_id_key: str):
+    if not state.client:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    store = get_history_store()
+    return {
+        "orders": state.client.sync_orders(account_id_key, store),
+        "transactions": state.client.sync_transactions(account_id_key, store)
+    }
+
+@app.get("/accounts/{account_id_key}/orders")
+def list_orders(account_id_key: str, background_tasks: BackgroundTasks, symbol: Optional[str] = None, status: Optional[str] = None,
+                start: Optional[date] = None, end: Optional[date] = None, limit: int = 100):
+    if not state.client:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    # Answered from the local index; a stale index pulls only records newer than the last sync.
+    store = get_history_store()
+    _refresh_history(store, "orders", account_id_key, background_tasks)
+
+    orders = store.query_orders(
+        account_id_key, symbol=symbol, status=status,
+        start=_to_millis(start), end=_to_millis(end + timedelta(days=1) if end else None), limit=limit
+    )
+    return {"orders": orders}
+
+@app.get("/accounts/{account_id_key}/transactions")
+def list_transactions(account_id_key: str, background_tasks: BackgroundTasks, symbol: Optional[str] = None,
+                      start: Optional[date] = None, end: Optional[date] = None, limit: int = 100):
+    if not state.client:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    store = get_history_store()
+    _refresh_history(store, "transactions", account_id_key, background_tasks)
+
+    transactions = store.query_transactions(
+        account_id_key, symbol=symbol,
+        start=_to_millis(start), end=_to_millis(end + timedelta(days=1) if end else None), limit=limit
+    )
+    return {"transactions": transactions}
+
 @app.post("/order/preview")
 def preview_order(req: OrderPreviewRequest):
     if not state.client:
@@ -137,8 +330,33 @@ def place_order(req: OrderPlaceRequest):
     if not result:
         raise HTTPException(status_code=400, detail="Order placement failed")
 
+    # Follow the order in the background; fills and cancels arrive on /order/events.
+    for order_id in result.get("PlaceOrderResponse", {}).get("OrderIds", []):
+        tracker.register(req.accountIdKey, order_id.get("orderId"), req.symbol.upper())
+
     return result
 
+@app.get("/order/events")
+async def order_events(request: Request):
+    if not state.client:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    queue = tracker.subscribe()
+
+    async def stream():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle stream.
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {json.dumps(event)}\n\n"
+        finally:
+            tracker.unsubscribe(queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
 @app.post("/gemini/chat")
 def chat_portfolio(req: ChatRequest):
     if not state.client:
@@ -147,7 +365,8 @@ def chat_portfolio(req: ChatRequest):
     if not state.gemini:
         if not state.gemini_api_key:
              raise HTTPException(status_code=400, detail="Gemini API Key missing")
-        state.gemini = GeminiClient(state.gemini_api_key)
+        with span("gemini.client_init"):
+            state.gemini = GeminiClient(state.gemini_api_key, cassette=state.cassette)
 
     portfolio_response = state.client.view_portfolio(req.accountIdKey)
     if not portfolio_response:
@@ -155,18 +374,19 @@ def chat_portfolio(req: ChatRequest):
 
     # Filter data for Gemini privacy: Only symbol, company, and quantity
     filtered_data = []
-    try:
-        portfolio_data = portfolio_response.get('PortfolioResponse', {}).get('AccountPortfolio', [])
-        if portfolio_data:
-            positions = portfolio_data[0].get('Position', [])
-            for pos in positions:
-                filtered_data.append({
-                    "symbol": pos.get('Product', {}).get('symbol'),
-                    "company": pos.get('symbolDescription'),
-                    "quantity": pos.get('quantity')
-                })
-    except (IndexError, AttributeError):
-        pass
+    with span("server.filter_positions"):
+        try:
+            portfolio_data = portfolio_response.get('PortfolioResponse', {}).get('AccountPortfolio', [])
+            if portfolio_data:
+                positions = portfolio_data[0].get('Position', [])
+                for pos in positions:
+                    filtered_data.append({
+                        "symbol": pos.get('Product', {}).get('symbol'),
+                        "company": pos.get('symbolDescription'),
+                        "quantity": pos.get('quantity')
+                    })
+        except (IndexError, AttributeError):
+            pass
 
     if not filtered_data:
         raise HTTPException(status_code=404, detail="No positions found in portfolio to analyze")
@@ -174,6 +394,41 @@ def chat_portfolio(req: ChatRequest):
     response = state.gemini.chat(filtered_data, req.message)
     return {"response": response}
 
+@app.post("/admin/profile")
+def start_profile(req: ProfileRequest, x_admin_token: Optional[str] = Header(None)):
+    require_admin(x_admin_token)
+    if not 0 < req.seconds <= 300:
+        raise HTTPException(status_code=400, detail="seconds must be between 0 and 300")
+    if not 0.001 <= req.interval <= 1:
+        raise HTTPException(status_code=400, detail="interval must be between 0.001 and 1")
+    if not profiler.start(req.seconds, req.interval):
+        raise HTTPException(status_code=409, detail="Profiler is already running")
+    return {"status": "started", "seconds": req.seconds}
+
+@app.get("/admin/profile", response_class=PlainTextResponse)
+def get_profile(x_admin_token: Optional[str] = Header(None)):
+    """
+    Sampled stacks in folded format (flamegraph.pl, speedscope). With shared
+    state, each worker adds its stacks when the run ends.
+    """
+    require_admin(x_admin_token)
+    return PlainTextResponse(profiler.folded(), headers={"X-Profile-Running": str(profiler.in_progress()).lower()})
+
+@app.get("/admin/traces")
+def list_traces(x_admin_token: Optional[str] = Header(None)):
+    require_admin(x_admin_token)
+    return {"traces": traces.list()}
+
+@app.get("/admin/traces/{trace_id}")
+def get_trace(trace_id: str, format: str = "chrome", x_admin_token: Optional[str] = Header(None)):
+    require_admin(x_admin_token)
+    trace = traces.get(trace_id)
+    if not trace:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    if format == "folded":
+        return PlainTextResponse(trace.to_folded())
+    return trace.to_chrome()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
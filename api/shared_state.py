@@ -0,0 +1,69 @@
+import json
+import os
+import stat
+
+def secure_directory(path):
+    """
+    Create `path` with mode 0700 if needed and check that it is a real
+    directory owned by this user and closed to everyone else. Returns False
+    (after printing why) when it cannot be trusted with session data.
+    """
+    if not hasattr(os, "getuid"):
+        return False
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        st = os.lstat(path)
+    except OSError as e:
+        print(f"Cannot use shared state directory {path}: {e}")
+        return False
+    if not stat.S_ISDIR(st.st_mode):
+        print(f"Cannot use shared state directory {path}: not a directory")
+        return False
+    if st.st_uid != os.getuid():
+        print(f"Cannot use shared state directory {path}: owned by uid {st.st_uid}")
+        return False
+    if stat.S_IMODE(st.st_mode) != 0o700:
+        print(f"Cannot use shared state directory {path}: mode is {oct(stat.S_IMODE(st.st_mode))}, expected 0o700")
+        return False
+    return True
+
+def write_private(path, data):
+    """
+    Atomically replace `path` with `data` (a string), readable only by this user.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+class SessionStore:
+    """
+    The login session (environment, OAuth request token, access credentials)
+    kept in a file so every worker process serves the same session. Workers
+    compare the file's modification time with the version they last loaded
+    to notice logins made by other workers.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, "session.json")
+
+    def version(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, session):
+        """
+        Write the session and return its new version.
+        """
+        write_private(self.path, json.dumps(session))
+        return self.version()
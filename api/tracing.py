@@ -0,0 +1,390 @@
+import functools
+import glob
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from contextvars import ContextVar
+
+from .shared_state import write_private
+
+# The active trace and innermost open span for the current request. Both are
+# None unless the request is being traced, which is the only thing span()
+# checks on the disabled path.
+_current_trace = ContextVar("trace", default=None)
+_current_span = ContextVar("span", default=None)
+
+class Trace:
+    """
+    Spans recorded for one request, exportable as a Chrome trace
+    (chrome://tracing, Perfetto) or as folded stacks for flamegraph tools.
+    """
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.pid = os.getpid()
+        self.spans = []
+        self.started = time.perf_counter_ns()
+        self.duration_ms = None
+        self._ids = itertools.count(1)
+
+    def to_dict(self):
+        return {"id": self.id, "name": self.name, "pid": self.pid, "spans": self.spans,
+                "started": self.started, "durationMs": self.duration_ms}
+
+    @classmethod
+    def from_dict(cls, data):
+        trace = cls(data["name"])
+        trace.id = data["id"]
+        trace.pid = data["pid"]
+        trace.spans = data["spans"]
+        trace.started = data["started"]
+        trace.duration_ms = data["durationMs"]
+        return trace
+
+    def to_chrome(self):
+        pid = self.pid
+        return {
+            "traceEvents": [
+                {
+                    "name": s["name"],
+                    "cat": s["name"].split(".")[0],
+                    "ph": "X",
+                    "ts": (s["start"] - self.started) / 1000,
+                    "dur": (s["end"] - s["start"]) / 1000,
+                    "pid": pid,
+                    "tid": s["thread"],
+                    "args": s["args"]
+                }
+                for s in self.spans
+            ],
+            "displayTimeUnit": "ms"
+        }
+
+    def to_folded(self):
+        """
+        Return "root;child;grandchild <self-time-us>" lines.
+        """
+        by_id = {s["id"]: s for s in self.spans}
+        child_time = defaultdict(int)
+        for s in self.spans:
+            if s["parent"] in by_id:
+                child_time[s["parent"]] += s["end"] - s["start"]
+
+        totals = defaultdict(int)
+        for s in self.spans:
+            path, node = [], s
+            while node:
+                path.append(node["name"])
+                node = by_id.get(node["parent"])
+            self_ns = (s["end"] - s["start"]) - child_time[s["id"]]
+            totals[";".join(reversed(path))] += max(self_ns, 0)
+        return "\n".join(f"{path} {ns // 1000}" for path, ns in sorted(totals.items())) + "\n"
+
+    def summary(self):
+        return {"id": self.id, "name": self.name, "durationMs": self.duration_ms, "spans": len(self.spans)}
+
+class _Span:
+    __slots__ = ("trace", "name", "args", "id", "parent", "start", "token")
+
+    def __init__(self, trace, name, args):
+        self.trace = trace
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.id = next(self.trace._ids)
+        self.parent = _current_span.get()
+        self.token = _current_span.set(self.id)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        _current_span.reset(self.token)
+        self.trace.spans.append({
+            "id": self.id, "parent": self.parent, "name": self.name, "args": self.args,
+            "start": self.start, "end": end, "thread": threading.get_ident()
+        })
+        return False
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP = _NoopSpan()
+
+def span(name, **args):
+    """
+    Time a block as a named span of the current request's trace. A no-op
+    when the request is not being traced.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP
+    return _Span(trace, name, args)
+
+def traced(name):
+    """
+    Decorator form of span() for functions and methods.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            trace = _current_trace.get()
+            if trace is None:
+                return fn(*args, **kwargs)
+            with _Span(trace, name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class TraceBuffer:
+    """
+    Keeps the most recent finished traces for retrieval by id. With a
+    `directory`, traces are also written there so every worker process can
+    serve them, and the buffer's contents are read from it.
+    """
+    def __init__(self, size=50, directory=None):
+        self.size = size
+        self.directory = directory
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, trace):
+        with self._lock:
+            self._traces[trace.id] = trace
+            while len(self._traces) > self.size:
+                self._traces.popitem(last=False)
+        if self.directory:
+            try:
+                write_private(self._path(trace.id), json.dumps(trace.to_dict()))
+                for path in self._files()[self.size:]:
+                    os.unlink(path)
+            except OSError as e:
+                print(f"Error sharing trace {trace.id}: {e}")
+
+    def get(self, trace_id):
+        with self._lock:
+            trace = self._traces.get(trace_id)
+        if trace or not self.directory or not re.fullmatch(r"[0-9a-f]{16}", trace_id):
+            return trace
+        return _load_trace(self._path(trace_id))
+
+    def list(self):
+        if self.directory:
+            traces = (_load_trace(path) for path in self._files())
+            return [t.summary() for t in traces if t]
+        with self._lock:
+            return [t.summary() for t in reversed(self._traces.values())]
+
+    def _path(self, trace_id):
+        return os.path.join(self.directory, f"trace-{trace_id}.json")
+
+    def _files(self):
+        """
+        Shared trace files, newest first.
+        """
+        paths = []
+        for path in glob.glob(os.path.join(self.directory, "trace-*.json")):
+            try:
+                paths.append((os.stat(path).st_mtime_ns, path))
+            except FileNotFoundError:
+                pass
+        return [path for _, path in sorted(paths, reverse=True)]
+
+def _load_trace(path):
+    try:
+        with open(path) as f:
+            return Trace.from_dict(json.load(f))
+    except (OSError, ValueError, KeyError):
+        return None
+
+class SamplingProfiler:
+    """
+    Samples every thread's Python stack at a fixed interval for a limited
+    time and aggregates the stacks in folded form.
+
+    With a `directory`, a run started in one worker process is announced in
+    profile.json there. The other workers join it the next time they handle
+    a request (checked at most once a second), each writes its stacks there
+    when the run ends, and folded() adds up every worker's stacks.
+    """
+    CHECK_INTERVAL = 1.0
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._counts = defaultdict(int)
+        self._until = 0.0
+        self._thread = None
+        self._run_id = None
+        self._next_check = 0.0
+        self._instance = uuid.uuid4().hex[:8]
+        self.interval = 0.005
+        self.samples = 0
+
+    @property
+    def running(self):
+        """
+        Whether this process is sampling, after joining any run another
+        worker has started.
+        """
+        if self.directory:
+            self._follow()
+        return time.monotonic() < self._until
+
+    def start(self, seconds, interval=0.005):
+        """
+        Start sampling for `seconds`. Returns False if a run is already in progress.
+        """
+        run = {"id": uuid.uuid4().hex[:16], "until": time.time() + seconds, "interval": interval}
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return False
+            if self.directory:
+                if self.in_progress():
+                    return False
+                for path in glob.glob(os.path.join(self.directory, "profile-*.folded")):
+                    os.unlink(path)
+                write_private(self._run_path(), json.dumps(run))
+            self._begin(run)
+            return True
+
+    def in_progress(self):
+        """
+        Whether any worker may still be sampling for the current run.
+        """
+        if not self.directory:
+            return self.running
+        run = self._shared_run()
+        return bool(run) and run["until"] > time.time()
+
+    def folded(self):
+        if not self.directory:
+            return self._local_folded()
+        run = self._shared_run()
+        counts = defaultdict(int)
+        for path in glob.glob(os.path.join(self.directory, f"profile-{run['id']}-*.folded")) if run else ():
+            try:
+                with open(path) as f:
+                    for line in f:
+                        stack, count = line.rsplit(" ", 1)
+                        counts[stack] += int(count)
+            except (OSError, ValueError):
+                continue
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(counts.items()))
+
+    def _local_folded(self):
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in sorted(self._counts.items()))
+
+    def _begin(self, run):
+        # Called with self._lock held.
+        self._counts = defaultdict(int)
+        self.samples = 0
+        self.interval = run["interval"]
+        self._run_id = run["id"]
+        self._until = time.monotonic() + (run["until"] - time.time())
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def _follow(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.CHECK_INTERVAL
+        run = self._shared_run()
+        if not run or run["id"] == self._run_id or run["until"] <= time.time():
+            return
+        with self._lock:
+            if not (self._thread and self._thread.is_alive()):
+                self._begin(run)
+
+    def _shared_run(self):
+        try:
+            with open(self._run_path()) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _run_path(self):
+        return os.path.join(self.directory, "profile.json")
+
+    def _run(self):
+        own = threading.get_ident()
+        while time.monotonic() < self._until:
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, frame in frames.items():
+                    if thread_id == own:
+                        continue
+                    self._counts[_folded_stack(frame)] += 1
+                self.samples += 1
+            time.sleep(self.interval)
+        if self.directory:
+            try:
+                write_private(
+                    os.path.join(self.directory, f"profile-{self._run_id}-{os.getpid()}-{self._instance}.folded"),
+                    self._local_folded()
+                )
+            except OSError as e:
+                print(f"Error sharing profile: {e}")
+
+def _folded_stack(frame):
+    names = []
+    while frame:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+class TracingMiddleware:
+    """
+    ASGI middleware that traces a request when it carries the trace header,
+    or while the sampling profiler is running. Finished traces go into
+    `buffer` and their id is returned in the X-Trace-Id response header.
+    Untraced requests pass straight through.
+    """
+    def __init__(self, app, buffer, profiler, header="x-trace"):
+        self.app = app
+        self.buffer = buffer
+        self.profiler = profiler
+        self.header = header.encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (self.profiler.running or self._requested(scope)):
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(f"{scope['method']} {scope['path']}")
+        trace_token = _current_trace.set(trace)
+
+        async def send_with_trace_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-trace-id", trace.id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            with _Span(trace, trace.name, {}):
+                await self.app(scope, receive, send_with_trace_id)
+        finally:
+            _current_trace.reset(trace_token)
+            trace.duration_ms = (time.perf_counter_ns() - trace.started) / 1e6
+            self.buffer.add(trace)
+
+    def _requested(self, scope):
+        for name, value in scope.get("headers", ()):
+            if name == self.header:
+                return value.lower() not in (b"", b"0", b"false")
+        return False
@@ -0,0 +1,92 @@
+"""
+End-to-end benchmark of the api.server stack against a replay cassette.
+
+Point a config file at a cassette recorded earlier, e.g. config_replay.json:
+
+    {..., "recording": {"mode": "replay", "cassette": "cassettes/sandbox.jsonl.gz"}}
+
+then run
+
+    python benchmarks/bench_replay.py --env replay [--iterations N] [--fast] [--profile]
+
+Requests go through FastAPI in-process; E*TRADE and Gemini responses come from
+the cassette with their recorded timings (or immediately with --fast).
+"""
+import argparse
+import cProfile
+import os
+import pstats
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fastapi.testclient import TestClient
+
+from api.server import app, state
+
+
+def timed(samples, label, call):
+    start = time.perf_counter()
+    response = call()
+    samples.setdefault(label, []).append((time.perf_counter() - start) * 1000)
+    response.raise_for_status()
+    return response.json()
+
+
+def run(client, iterations, chat_message):
+    samples = {}
+    accounts = timed(samples, "GET /accounts", lambda: client.get("/accounts"))
+    account_list = accounts["accounts"]["AccountListResponse"]["Accounts"]["Account"]
+    key = account_list[0]["accountIdKey"]
+
+    for _ in range(iterations):
+        timed(samples, "GET /accounts", lambda: client.get("/accounts"))
+        timed(samples, "GET /accounts/{id}/balance", lambda: client.get(f"/accounts/{key}/balance"))
+        timed(samples, "GET /portfolio/{id}", lambda: client.get(f"/portfolio/{key}"))
+        if chat_message:
+            timed(samples, "POST /gemini/chat", lambda: client.post(
+                "/gemini/chat", json={"accountIdKey": key, "message": chat_message}
+            ))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--env", default="replay", help="uses config_<env>.json")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--chat", default=None, help="also benchmark /gemini/chat with this message")
+    parser.add_argument("--fast", action="store_true", help="skip recorded network delays")
+    parser.add_argument("--profile", action="store_true", help="print a cProfile summary")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    client = TestClient(app)
+    client.post("/auth/initialize", json={"env": args.env}).raise_for_status()
+    client.post("/auth/verify", json={"verifier": "replay"}).raise_for_status()
+    if not state.cassette or not state.cassette.replaying:
+        sys.exit(f"config_{args.env}.json has no replay recording configured")
+    if args.fast:
+        state.cassette.realtime = False
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    samples = run(client, args.iterations, args.chat)
+    if profiler:
+        profiler.disable()
+
+    for label, values in samples.items():
+        values.sort()
+        p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+        print(f"{label:32s} n={len(values):4d}  median {statistics.median(values):8.2f} ms  p95 {p95:8.2f} ms")
+
+    if profiler:
+        print()
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Startup benchmark for the backend.
+
+Measures what a freshly spawned worker pays before it can serve a request:
+the time to import api.server, the resident memory afterwards, and which
+heavy SDKs were pulled in. Each sample runs in a new interpreter so nothing
+is cached between runs.
+
+    python benchmarks/bench_startup.py [--runs N] [--top N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that should only be imported once the feature using them is hit.
+LAZY_MODULES = ["google.genai"]
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "loaded": [m for m in {lazy!r} if m in sys.modules],
+}}))
+"""
+
+
+def measure_import(module, runs):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, lazy=LAZY_MODULES)],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        )
+        samples.append(json.loads(out.stdout))
+    return samples
+
+
+def import_profile(module, top):
+    """
+    Run `python -X importtime` and return the slowest imports by cumulative time.
+    """
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def report(label, samples):
+    seconds = [s["seconds"] * 1000 for s in samples]
+    rss = [s["max_rss_kb"] / 1024 for s in samples]
+    print(f"{label}")
+    print(f"  import time   median {statistics.median(seconds):8.1f} ms   min {min(seconds):8.1f} ms")
+    print(f"  peak RSS      median {statistics.median(rss):8.1f} MB")
+    print(f"  lazy modules loaded at import: {samples[0]['loaded'] or 'none'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    report("api.server (worker cold start)", measure_import("api.server", args.runs))
+    for module in LAZY_MODULES:
+        report(f"{module} (deferred until first use)", measure_import(module, args.runs))
+
+    print(f"\nSlowest imports for api.server (cumulative, top {args.top}):")
+    for cumulative_us, self_us, name in import_profile("api.server", args.top):
+        print(f"  {cumulative_us / 1000:8.1f} ms  (self {self_us / 1000:6.1f} ms)  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -34,6 +34,10 @@ export class ApiService {
     return this.http.get(`${this.baseUrl}/portfolio/${id}`);
   }
 
+  getOrders(id: string, params: any = {}): Observable<any> {
+    return this.http.get(`${this.baseUrl}/accounts/${id}/orders`, { params });
+  }
+
   previewOrder(data: any): Observable<any> {
     return this.http.post(`${this.baseUrl}/order/preview`, data);
   }
@@ -42,6 +46,14 @@ export class ApiService {
     return this.http.post(`${this.baseUrl}/order/place`, data);
   }
 
+  orderEvents(): Observable<any> {
+    return new Observable(observer => {
+      const source = new EventSource(`${this.baseUrl}/order/events`);
+      source.onmessage = (event) => observer.next(JSON.parse(event.data));
+      return () => source.close();
+    });
+  }
+
   chatGemini(data: any): Observable<any> {
     return this.http.post(`${this.baseUrl}/gemini/chat`, data);
   }
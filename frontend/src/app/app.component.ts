@@ -1,4 +1,5 @@
-import { Component, OnInit } from '@angular/core';
+import { Component, OnDestroy, OnInit } from '@angular/core';
+import { Subscription } from 'rxjs';
 import { CommonModule } from '@angular/common';
 import { FormsModule } from '@angular/forms';
 import { ApiService } from './api.service';
@@ -13,6 +14,9 @@ import {
   MessageSquare
 } from 'lucide-angular';
 
+// Order statuses after which positions and cash have changed.
+const FILLED_STATUSES = ['EXECUTED', 'PARTIAL', 'INDIVIDUAL_FILLS'];
+
 @Component({
   selector: 'app-root',
   standalone: true,
@@ -28,7 +32,7 @@ import {
     { provide: 'LucideIcons', useValue: { Briefcase, LayoutDashboard, Send, ShoppingCart, User, RefreshCw, MessageSquare } }
   ]
 })
-export class AppComponent implements OnInit {
+export class AppComponent implements OnInit, OnDestroy {
   // Icons for template usage
   readonly Briefcase = 'Briefcase';
   readonly LayoutDashboard = 'LayoutDashboard';
@@ -44,6 +48,7 @@ export class AppComponent implements OnInit {
   accounts: any[] = [];
   selectedAccount: any = null;
   portfolio: any[] = [];
+  orders: any[] = [];
   balances: any = null;
   messages: any[] = [];
   chatInput = '';
@@ -56,6 +61,10 @@ export class AppComponent implements OnInit {
   order = { symbol: '', action: 'BUY', quantity: 1, priceType: 'MARKET' };
   preview: any = null;
   orderLoading = false;
+  orderEvents: any[] = [];
+  private orderEventsSub: Subscription | null = null;
+  // Orders /order/events has reported on, so no fallback check is needed for them.
+  private reportedOrderIds = new Set<number>();
 
   constructor(private api: ApiService) {}
 
@@ -69,6 +78,7 @@ export class AppComponent implements OnInit {
         this.authStatus = data;
         if (data.authenticated) {
           this.fetchAccounts();
+          this.listenForOrderEvents();
         }
         this.loading = false;
       },
@@ -79,6 +89,43 @@ export class AppComponent implements OnInit {
     });
   }
 
+  ngOnDestroy() {
+    this.orderEventsSub?.unsubscribe();
+  }
+
+  listenForOrderEvents() {
+    if (this.orderEventsSub) return;
+    this.orderEventsSub = this.api.orderEvents().subscribe(event => {
+      this.orderEvents.unshift(event);
+      this.reportedOrderIds.add(event.orderId);
+      if (event.accountIdKey !== this.selectedAccount?.accountIdKey) return;
+      // Only a fill changes positions, so refresh them then rather than on every order.
+      if (event.invalidate?.length) {
+        this.handleSelectAccount(this.selectedAccount);
+      } else {
+        this.fetchOrders();
+      }
+    });
+  }
+
+  scheduleFallbackRefresh(account: any, orderIds: number[]) {
+    // The event stream can be served by a different backend worker than the one
+    // tracking the order. That worker still writes status changes to the shared
+    // history, so check it once for orders no event has arrived for.
+    if (orderIds.every(id => this.reportedOrderIds.has(id))) return;
+    setTimeout(() => {
+      const pending = orderIds.filter(id => !this.reportedOrderIds.has(id));
+      if (!pending.length || this.selectedAccount !== account) return;
+      this.api.getOrders(account.accountIdKey, { limit: 20 }).subscribe(res => {
+        if (this.selectedAccount !== account) return;
+        this.orders = res.orders;
+        const filled = res.orders.some((o: any) =>
+          pending.includes(o.orderId) && FILLED_STATUSES.includes(o.OrderDetail?.[0]?.status));
+        if (filled) this.refreshPositions(account);
+      });
+    }, 10000);
+  }
+
   fetchAccounts() {
     this.api.getAccounts().subscribe({
       next: (data) => {
@@ -94,6 +141,11 @@ export class AppComponent implements OnInit {
 
   handleSelectAccount(acc: any) {
     this.selectedAccount = acc;
+    this.refreshPositions(acc);
+    this.fetchOrders();
+  }
+
+  refreshPositions(acc: any) {
     this.api.getBalance(acc.accountIdKey).subscribe(res => {
       this.balances = res.balance.BalanceResponse;
     });
@@ -102,6 +154,12 @@ export class AppComponent implements OnInit {
     });
   }
 
+  fetchOrders() {
+    this.api.getOrders(this.selectedAccount.accountIdKey, { limit: 20 }).subscribe(res => {
+      this.orders = res.orders;
+    });
+  }
+
   onAccountChange(event: any) {
     const acc = this.accounts.find(a => a.accountId === event.target.value);
     if (acc) this.handleSelectAccount(acc);
@@ -178,12 +236,13 @@ export class AppComponent implements OnInit {
       quantity: this.order.quantity,
       priceType: this.order.priceType
     }).subscribe({
-      next: () => {
+      next: (res) => {
         alert('Order placed successfully!');
         this.preview = null;
         this.order = { symbol: '', action: 'BUY', quantity: 1, priceType: 'MARKET' };
-        this.handleSelectAccount(this.selectedAccount);
         this.orderLoading = false;
+        const orderIds = (res.PlaceOrderResponse?.OrderIds || []).map((o: any) => o.orderId);
+        this.scheduleFallbackRefresh(this.selectedAccount, orderIds);
       },
       error: () => {
         alert('Order placement failed');
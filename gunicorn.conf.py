@@ -0,0 +1,32 @@
+# Gunicorn configuration for running the API with uvicorn workers.
+#
+#   WEB_CONCURRENCY=4 gunicorn -c gunicorn.conf.py api.server:app
+#
+# Settings can be overridden through the environment. One worker is the default.
+import os
+import tempfile
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# Workers only serve the same login if they share it through SHARED_STATE_DIR
+# (a private 0700 directory; see api/shared_state.py). Set it here before the
+# app is imported so every worker sees it.
+if workers > 1:
+    os.environ.setdefault(
+        "SHARED_STATE_DIR", os.path.join(tempfile.gettempdir(), f"etrade-api-{os.getuid()}")
+    )
+
+# Import the app once in the master before forking so workers share the
+# already-loaded modules copy-on-write instead of each importing them again.
+# Heavy SDKs (google.genai) are imported lazily on first use, so they are not
+# part of the preloaded image.
+preload_app = os.environ.get("PRELOAD_APP", "true").lower() == "true"
+
+timeout = int(os.environ.get("WORKER_TIMEOUT", 60))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
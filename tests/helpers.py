@@ -0,0 +1,38 @@
+import json
+from unittest.mock import MagicMock
+
+def fake_response(body, status_code=200):
+    """
+    A requests.Response stand-in for transports that return JSON.
+    """
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = {"Content-Type": "application/json"}
+    response.url = "https://api.com/v1/accounts/list.json"
+    response.encoding = "utf-8"
+    response.content = json.dumps(body).encode("utf-8")
+    response.json.return_value = body
+    return response
+
+def make_order(order_id, status, symbol="AAPL", placed_time=1_000, filled=None):
+    """
+    An order as returned by the E*TRADE orders list. Executed orders are fully
+    filled unless `filled` says otherwise.
+    """
+    if filled is None:
+        filled = 10 if status == "EXECUTED" else 0
+    return {
+        "orderId": order_id,
+        "orderType": "EQ",
+        "OrderDetail": [{
+            "placedTime": placed_time,
+            "status": status,
+            "priceType": "MARKET",
+            "Instrument": [{
+                "Product": {"symbol": symbol, "securityType": "EQ"},
+                "orderAction": "BUY",
+                "orderedQuantity": 10,
+                "filledQuantity": filled
+            }]
+        }]
+    }
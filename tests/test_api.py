@@ -1,7 +1,14 @@
+import json
+import os
 import unittest
+import subprocess
+import sys
+import tempfile
 from unittest.mock import patch, MagicMock
 from fastapi.testclient import TestClient
-from api.server import app, state
+from api.server import app, state, tracker
+from api.history_store import HistoryStore
+from api.shared_state import SessionStore
 
 class TestAPI(unittest.TestCase):
     def setUp(self):
@@ -12,6 +19,10 @@ class TestAPI(unittest.TestCase):
         state.gemini = None
         state.env = "sandbox"
         state.gemini_api_key = None
+        state.history = HistoryStore(":memory:")
+        state.cassette = None
+        state.credentials = None
+        state.session_version = None
 
     @patch('api.server.ETradeAuth')
     @patch('os.path.exists')
@@ -27,6 +38,29 @@ class TestAPI(unittest.TestCase):
         self.assertEqual(state.env, "sandbox")
         self.assertIsNotNone(state.auth)
 
+    def test_initialize_auth_with_missing_or_corrupt_cassette(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(tmp.name)
+        with open("config_replay.json", "w") as f:
+            json.dump({"consumer_key": "ck", "consumer_secret": "cs", "base_url": "https://api.com", "auth_url": "https://auth.com",
+                       "recording": {"mode": "replay", "cassette": "missing.jsonl.gz"}}, f)
+
+        response = self.client.post("/auth/initialize", json={"env": "replay"})
+
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("missing.jsonl.gz", response.json()["detail"])
+
+        with open("missing.jsonl.gz", "wb") as f:
+            f.write(b"corrupt")
+        response = self.client.post("/auth/initialize", json={"env": "replay"})
+        self.assertEqual(response.status_code, 422)
+        self.assertIn("missing.jsonl.gz is unreadable", response.json()["detail"])
+
+    def test_order_events_require_login(self):
+        self.assertEqual(self.client.get("/order/events").status_code, 401)
+
     @patch('api.server.ETradeClient')
     def test_verify_auth(self, mock_client):
         state.auth = MagicMock()
@@ -81,6 +115,67 @@ class TestAPI(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json(), {"previewId": 123})
 
+    def test_list_orders_syncs_once_then_answers_locally(self):
+        state.client = MagicMock()
+        state.client.sync_orders.side_effect = lambda account_id_key, store: store.upsert_orders(account_id_key, [
+            {"orderId": 1, "OrderDetail": [{"placedTime": 1_704_196_800_000, "status": "EXECUTED",
+                                            "Instrument": [{"Product": {"symbol": "AAPL"}}]}]}
+        ])
+
+        response = self.client.get("/accounts/key1/orders", params={"symbol": "AAPL", "start": "2024-01-02", "end": "2024-01-02"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([o["orderId"] for o in response.json()["orders"]], [1])
+
+        response = self.client.get("/accounts/key1/orders", params={"status": "OPEN"})
+        self.assertEqual(response.json(), {"orders": []})
+        state.client.sync_orders.assert_called_once()
+
+    def test_stale_history_is_answered_then_synced_in_background(self):
+        state.client = MagicMock()
+        synced = [[], [{"transactionId": 1, "transactionDate": 1_704_196_800_000, "Brokerage": {"Product": {"symbol": "AAPL"}}}]]
+        state.client.sync_transactions.side_effect = lambda account_id_key, store: store.upsert_transactions(account_id_key, synced.pop(0))
+
+        self.client.get("/accounts/key1/transactions")
+        with patch('api.server.HISTORY_MAX_AGE', -1):
+            # Served from the index; the sync runs after the response.
+            self.assertEqual(self.client.get("/accounts/key1/transactions").json(), {"transactions": []})
+        self.assertEqual(state.client.sync_transactions.call_count, 2)
+        self.assertEqual(len(self.client.get("/accounts/key1/transactions").json()["transactions"]), 1)
+
+    def test_one_background_sync_per_account(self):
+        state.client = MagicMock()
+        state.client.sync_orders.side_effect = lambda account_id_key, store: store.upsert_orders(account_id_key, [])
+        self.client.get("/accounts/key1/orders")
+
+        with patch('api.server.HISTORY_MAX_AGE', -1), patch('api.server._history_syncs', {("orders", "key1")}):
+            self.client.get("/accounts/key1/orders")
+        state.client.sync_orders.assert_called_once()
+
+    def test_sync_history(self):
+        state.client = MagicMock()
+        state.client.sync_orders.return_value = 3
+        state.client.sync_transactions.return_value = 5
+
+        response = self.client.post("/accounts/key1/history/sync")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"orders": 3, "transactions": 5})
+
+    @patch.object(tracker, 'register')
+    def test_place_order_registers_with_tracker(self, mock_register):
+        state.client = MagicMock()
+        state.client.place_order.return_value = {"PlaceOrderResponse": {"OrderIds": [{"orderId": 67890}]}}
+
+        payload = {
+            "accountIdKey": "key1",
+            "previewId": 123,
+            "symbol": "aapl",
+            "orderAction": "BUY",
+            "quantity": 1
+        }
+        response = self.client.post("/order/place", json=payload)
+        self.assertEqual(response.status_code, 200)
+        mock_register.assert_called_once_with("key1", 67890, "AAPL")
+
     @patch('api.server.GeminiClient')
     def test_gemini_chat(self, mock_gemini):
         state.client = MagicMock()
@@ -113,5 +208,95 @@ class TestAPI(unittest.TestCase):
         expected_data = [{"symbol": "AAPL", "company": "Apple Inc.", "quantity": 10}]
         state.gemini.chat.assert_called_with(expected_data, "hello")
 
+class TestSharedSession(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(app)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.sessions_patch = patch('api.server.sessions', SessionStore(self.tmp.name))
+        self.sessions_patch.start()
+        self.switch_worker()
+
+    def tearDown(self):
+        self.sessions_patch.stop()
+        self.tmp.cleanup()
+        self.switch_worker()
+
+    def switch_worker(self):
+        # A freshly forked worker has none of the login state in memory.
+        state.auth = None
+        state.client = None
+        state.credentials = None
+        state.env = "sandbox"
+        state.session_version = None
+
+    @patch('api.server.ETradeClient')
+    @patch('api.server.ETradeAuth')
+    @patch('os.path.exists')
+    def test_login_is_shared_between_workers(self, mock_exists, mock_auth, mock_client):
+        mock_exists.return_value = True
+        auth = mock_auth.return_value
+        auth.oauth_token, auth.oauth_token_secret, auth.cassette = "rt", "rts", None
+        auth.get_access_token.return_value = {"access_token": "at", "gemini_api_key": "g"}
+
+        self.assertEqual(self.client.post("/auth/initialize", json={"env": "prod"}).status_code, 200)
+
+        self.switch_worker()
+        self.assertEqual(self.client.post("/auth/verify", json={"verifier": "1234"}).status_code, 200)
+        self.assertEqual((auth.oauth_token, auth.oauth_token_secret), ("rt", "rts"))
+        mock_auth.assert_called_with("config_prod.json")
+
+        self.switch_worker()
+        self.assertEqual(self.client.get("/status").json(), {"authenticated": True, "env": "prod"})
+        self.assertEqual(mock_client.call_args.args[0], {"access_token": "at", "gemini_api_key": "g"})
+        self.assertEqual(state.gemini_api_key, "g")
+
+class TestTracingEndpoints(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(app)
+        state.client = MagicMock()
+        state.client.view_portfolio.return_value = {"Position": []}
+
+    def tearDown(self):
+        state.client = None
+
+    def test_untraced_request_has_no_trace_id(self):
+        response = self.client.get("/portfolio/key1")
+        self.assertNotIn("x-trace-id", response.headers)
+
+    @patch.dict('os.environ', {"ADMIN_TOKEN": "secret"})
+    def test_trace_header_records_request(self):
+        response = self.client.get("/portfolio/key1", headers={"X-Trace": "1"})
+        trace_id = response.headers["x-trace-id"]
+
+        response = self.client.get(f"/admin/traces/{trace_id}", headers={"X-Admin-Token": "secret"})
+        self.assertEqual(response.status_code, 200)
+        names = [e["name"] for e in response.json()["traceEvents"]]
+        self.assertIn("GET /portfolio/key1", names)
+
+        response = self.client.get(f"/admin/traces/{trace_id}", params={"format": "folded"}, headers={"X-Admin-Token": "secret"})
+        self.assertTrue(response.text.startswith("GET /portfolio/key1 "))
+
+    @patch.dict('os.environ', {"ADMIN_TOKEN": "secret"})
+    def test_admin_requires_token(self):
+        self.assertEqual(self.client.get("/admin/traces").status_code, 403)
+        self.assertEqual(self.client.get("/admin/traces", headers={"X-Admin-Token": "secret"}).status_code, 200)
+
+    @patch.dict('os.environ', {"ADMIN_TOKEN": "secret"})
+    def test_profile_interval_is_bounded(self):
+        for interval in (0, -1, 0.0005, 2):
+            response = self.client.post("/admin/profile", json={"seconds": 1, "interval": interval}, headers={"X-Admin-Token": "secret"})
+            self.assertEqual(response.status_code, 400)
+
+    @patch.dict('os.environ', {}, clear=True)
+    def test_admin_disabled_without_token(self):
+        self.assertEqual(self.client.post("/admin/profile", json={"seconds": 1}).status_code, 404)
+
+class TestStartup(unittest.TestCase):
+    def test_server_import_does_not_load_genai(self):
+        # Run in a fresh interpreter; this process may already have imported it.
+        code = "import sys, api.server; print('google.genai' in sys.modules)"
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        self.assertEqual(out.stdout.strip(), "False")
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,185 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from requests_oauthlib import OAuth1
+
+from api.coalescing import CoalescingTransport, InflightRegistry
+from tests.helpers import fake_response
+
+class SlowTransport:
+    """
+    Blocks every GET until released so calls are guaranteed to overlap.
+    """
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.get_calls = 0
+        self.post = MagicMock(return_value=fake_response({"ok": True}))
+
+    def get(self, url, **kwargs):
+        self.get_calls += 1
+        self.started.set()
+        self.release.wait(5)
+        return fake_response({"ok": True})
+
+def run_concurrently(fn, count):
+    results = [None] * count
+    def worker(i):
+        results[i] = fn()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for t in threads:
+        t.start()
+    return threads, results
+
+class TestInflightRegistry(unittest.TestCase):
+    def test_error_reaches_every_waiter(self):
+        registry = InflightRegistry()
+        started, release = threading.Event(), threading.Event()
+
+        def failing():
+            started.set()
+            release.wait(5)
+            raise ValueError("upstream down")
+
+        errors = []
+        def call():
+            try:
+                registry.do("k", failing)
+            except ValueError as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=call)
+        follower.start()
+        time.sleep(0.05)
+        release.set()
+        leader.join()
+        follower.join()
+        self.assertEqual(len(errors), 2)
+
+class TestCoalescingTransport(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_identical_gets_share_one_call(self):
+        inner = SlowTransport()
+        transport = CoalescingTransport(inner, shared_dir=self.tmp.name)
+
+        threads, results = run_concurrently(lambda: transport.get("https://api.com/x", params={"a": 1}), 5)
+        inner.started.wait(5)
+        time.sleep(0.05)
+        inner.release.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(inner.get_calls, 1)
+        self.assertEqual(transport.stats, {"upstream": 1, "coalesced": 4})
+        self.assertTrue(all(r is results[0] for r in results))
+
+    def test_different_params_are_not_coalesced(self):
+        inner = SlowTransport()
+        inner.release.set()
+        transport = CoalescingTransport(inner, shared_dir=self.tmp.name)
+
+        transport.get("https://api.com/x", params={"a": 1})
+        transport.get("https://api.com/x", params={"a": 2})
+        self.assertEqual(inner.get_calls, 2)
+
+    def test_posts_are_never_coalesced(self):
+        inner = SlowTransport()
+        transport = CoalescingTransport(inner, shared_dir=self.tmp.name)
+
+        transport.post("https://api.com/orders/place.json", json={})
+        transport.post("https://api.com/orders/place.json", json={})
+        self.assertEqual(inner.post.call_count, 2)
+
+    def run_two_workers(self, leader_auth, follower_auth, **options):
+        # Two transports with separate registries stand in for two worker processes.
+        leader_inner, follower_inner = SlowTransport(), SlowTransport()
+        follower_inner.release.set()
+        leader = CoalescingTransport(leader_inner, shared_dir=self.tmp.name, **options)
+        follower = CoalescingTransport(follower_inner, shared_dir=self.tmp.name, **options)
+
+        leader_threads, _ = run_concurrently(lambda: leader.get("https://api.com/x", auth=leader_auth), 1)
+        leader_inner.started.wait(5)
+        follower_threads, follower_results = run_concurrently(lambda: follower.get("https://api.com/x", auth=follower_auth), 1)
+        time.sleep(0.05)
+        leader_inner.release.set()
+        for t in leader_threads + follower_threads:
+            t.join()
+        return follower, follower_inner, follower_results[0]
+
+    def test_workers_share_result_through_lock_files(self):
+        # Workers build their own OAuth1 from the shared session's token.
+        follower, follower_inner, response = self.run_two_workers(
+            OAuth1("ck", "cs", "at", "ats"), OAuth1("ck", "cs", "at", "ats")
+        )
+
+        self.assertEqual(follower_inner.get_calls, 0)
+        self.assertEqual(response.json(), {"ok": True})
+        self.assertEqual(follower.stats["coalesced"], 1)
+
+    def test_workers_with_different_tokens_are_not_coalesced(self):
+        follower, follower_inner, _ = self.run_two_workers(
+            OAuth1("ck", "cs", "at", "ats"), OAuth1("ck", "cs", "other", "ots")
+        )
+
+        self.assertEqual(follower_inner.get_calls, 1)
+        self.assertEqual(follower.stats["coalesced"], 0)
+
+    def test_shared_results_are_deleted(self):
+        self.run_two_workers(OAuth1("ck", "cs", "at", "ats"), OAuth1("ck", "cs", "at", "ats"), result_ttl=0.05)
+        time.sleep(0.2)
+
+        # Only the (empty) lock files remain.
+        self.assertEqual([name for name in os.listdir(self.tmp.name) if not name.startswith("lock-")], [])
+
+    def test_one_reaper_for_many_results(self):
+        inner = SlowTransport()
+        inner.release.set()
+        transport = CoalescingTransport(inner, shared_dir=self.tmp.name, result_ttl=0.1)
+        with patch('api.coalescing.threading.Thread', wraps=threading.Thread) as thread:
+            for i in range(20):
+                transport.get("https://api.com/x", params={"page": i})
+
+        thread.assert_called_once()
+        time.sleep(0.3)
+        self.assertEqual([name for name in os.listdir(self.tmp.name) if not name.startswith("lock-")], [])
+        self.assertIsNone(transport._reaper)
+
+    def test_old_results_are_swept_on_startup(self):
+        leftover = os.path.join(self.tmp.name, "abc.json")
+        open(leftover, "w").close()
+        os.utime(leftover, (time.time() - 60, time.time() - 60))
+
+        CoalescingTransport(SlowTransport(), shared_dir=self.tmp.name)
+        self.assertFalse(os.path.exists(leftover))
+
+    def test_insecure_directory_falls_back_to_in_process(self):
+        os.chmod(self.tmp.name, 0o755)
+        self.assertIsNone(CoalescingTransport(SlowTransport(), shared_dir=self.tmp.name).shared_dir)
+
+    def test_in_process_only_by_default(self):
+        self.assertIsNone(CoalescingTransport(SlowTransport()).shared_dir)
+
+    def test_stale_shared_result_is_not_reused(self):
+        first = SlowTransport()
+        first.release.set()
+        CoalescingTransport(first, shared_dir=self.tmp.name).get("https://api.com/x")
+
+        second = SlowTransport()
+        second.release.set()
+        CoalescingTransport(second, shared_dir=self.tmp.name).get("https://api.com/x")
+        self.assertEqual(second.get_calls, 1)
+
+if __name__ == '__main__':
+    unittest.main()
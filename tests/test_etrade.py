@@ -3,6 +3,7 @@ from unittest.mock import patch, MagicMock
 import json
 import sys
 import os
+from datetime import date
 
 # Add the current directory to path so we can import our modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -147,6 +148,31 @@ class TestETradeApp(unittest.TestCase):
         self.assertEqual(place['PlaceOrderResponse']['OrderIds'][0]['orderId'], 67890)
         mock_post.assert_called_once()
 
+    @patch('api.etrade_client.requests.get')
+    def test_list_orders_no_content(self, mock_get):
+        mock_response = MagicMock()
+        mock_response.status_code = 204
+        mock_get.return_value = mock_response
+
+        client = ETradeClient('key', 'secret', 'at', 'ats', 'https://api.com')
+        orders = client.list_orders('acc_key', status='OPEN')
+
+        self.assertEqual(orders, {'OrdersResponse': {'Order': []}})
+        self.assertEqual(mock_get.call_args.kwargs['params'], {'count': 100, 'status': 'OPEN'})
+
+    @patch('api.etrade_client.requests.get')
+    def test_list_transactions(self, mock_get):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {'TransactionListResponse': {'Transaction': [{'transactionId': 1}]}}
+        mock_get.return_value = mock_response
+
+        client = ETradeClient('key', 'secret', 'at', 'ats', 'https://api.com')
+        transactions = client.list_transactions('acc_key', start_date=date(2024, 1, 2))
+
+        self.assertEqual(transactions['TransactionListResponse']['Transaction'][0]['transactionId'], 1)
+        self.assertEqual(mock_get.call_args.kwargs['params']['startDate'], '01022024')
+
 class TestGeminiClient(unittest.TestCase):
 
     @patch('google.genai.Client')
@@ -0,0 +1,91 @@
+import unittest
+from unittest.mock import MagicMock
+from datetime import date
+
+from api.etrade_client import ETradeClient
+from api.history_store import HistoryStore
+from tests.helpers import make_order
+
+def make_transaction(txn_id, symbol, transaction_date):
+    return {
+        "transactionId": txn_id,
+        "transactionDate": transaction_date,
+        "transactionType": "Bought",
+        "amount": -1500.0,
+        "description": f"Bought {symbol}",
+        "Brokerage": {"Product": {"symbol": symbol}, "quantity": 10, "price": 150.0}
+    }
+
+class TestHistoryStore(unittest.TestCase):
+    def setUp(self):
+        self.store = HistoryStore(":memory:")
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_query_orders_by_symbol_status_and_date(self):
+        self.store.upsert_orders("acc", [
+            make_order(1, "EXECUTED", placed_time=1_000),
+            make_order(2, "OPEN", symbol="MSFT", placed_time=2_000),
+            make_order(3, "CANCELLED", placed_time=3_000),
+        ])
+
+        self.assertEqual([o["orderId"] for o in self.store.query_orders("acc", symbol="aapl")], [3, 1])
+        self.assertEqual([o["orderId"] for o in self.store.query_orders("acc", status="OPEN")], [2])
+        self.assertEqual([o["orderId"] for o in self.store.query_orders("acc", start=1_500, end=3_000)], [2])
+        self.assertEqual(self.store.query_orders("other"), [])
+
+    def test_order_high_water_mark_waits_for_open_orders(self):
+        self.assertIsNone(self.store.get_high_water_mark("orders", "acc"))
+
+        self.store.upsert_orders("acc", [make_order(1, "OPEN", placed_time=1_000), make_order(2, "EXECUTED", placed_time=2_000)])
+        self.assertEqual(self.store.get_high_water_mark("orders", "acc"), 1_000)
+
+        # Once the open order fills the mark advances to the newest order.
+        self.store.upsert_orders("acc", [make_order(1, "EXECUTED", placed_time=1_000)])
+        self.assertEqual(self.store.get_high_water_mark("orders", "acc"), 2_000)
+        self.assertEqual(len(self.store.query_orders("acc")), 2)
+
+    def test_transactions_are_deduplicated(self):
+        self.store.upsert_transactions("acc", [make_transaction(10, "AAPL", 1_000)])
+        self.store.upsert_transactions("acc", [make_transaction(10, "AAPL", 1_000), make_transaction(11, "TSLA", 2_000)])
+
+        self.assertEqual([t["transactionId"] for t in self.store.query_transactions("acc")], [11, 10])
+        self.assertEqual(self.store.get_high_water_mark("transactions", "acc"), 2_000)
+        self.assertIsNotNone(self.store.last_synced("transactions", "acc"))
+
+class TestHistorySync(unittest.TestCase):
+    def setUp(self):
+        self.store = HistoryStore(":memory:")
+        self.client = ETradeClient('key', 'secret', 'at', 'ats', 'https://api.com')
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_sync_orders_follows_markers(self):
+        self.client.list_orders = MagicMock(side_effect=[
+            {"OrdersResponse": {"marker": "m1", "Order": [make_order(1, "EXECUTED", placed_time=1_000)]}},
+            {"OrdersResponse": {"Order": [make_order(2, "EXECUTED", symbol="MSFT", placed_time=2_000)]}},
+        ])
+
+        self.assertEqual(self.client.sync_orders("acc", self.store), 2)
+        self.assertEqual(self.client.list_orders.call_count, 2)
+        self.assertEqual(self.client.list_orders.call_args_list[1].kwargs["marker"], "m1")
+        # First sync has no high-water mark, so no date filter is sent.
+        self.assertIsNone(self.client.list_orders.call_args_list[0].kwargs["from_date"])
+
+    def test_sync_transactions_resumes_from_high_water_mark(self):
+        # 2024-03-15T12:00:00Z
+        self.store.upsert_transactions("acc", [make_transaction(10, "AAPL", 1_710_504_000_000)])
+        self.client.list_transactions = MagicMock(return_value={
+            "TransactionListResponse": {"moreTransactions": False, "Transaction": [make_transaction(11, "AAPL", 1_710_590_400_000)]}
+        })
+
+        self.assertEqual(self.client.sync_transactions("acc", self.store), 1)
+        kwargs = self.client.list_transactions.call_args.kwargs
+        self.assertEqual(kwargs["start_date"], date(2024, 3, 14))
+        self.assertEqual(kwargs["end_date"], date.today())
+        self.assertEqual(len(self.store.query_transactions("acc")), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock
+
+from api.etrade_client import ETradeClient
+from api.history_store import HistoryStore
+from api.order_tracker import OrderTracker, poll_interval
+from tests.helpers import make_order
+
+class TestOrderTracker(unittest.TestCase):
+    def setUp(self):
+        self.client = ETradeClient('key', 'secret', 'at', 'ats', 'https://api.com')
+        self.client.list_orders = MagicMock()
+        self.store = HistoryStore(":memory:")
+        self.tracker = OrderTracker(lambda: self.client, lambda: self.store)
+        # Keep the background thread out of these tests; poll_account is driven directly.
+        self.tracker._ensure_thread = lambda: None
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_poll_interval_grows_with_age(self):
+        self.assertEqual(poll_interval(5), 2)
+        self.assertEqual(poll_interval(300), 10)
+        self.assertEqual(poll_interval(1800), 30)
+        self.assertEqual(poll_interval(7200), 120)
+
+    def test_one_list_call_per_account(self):
+        self.tracker.register("acc", 1)
+        self.tracker.register("acc", 2)
+        self.client.list_orders.return_value = {"OrdersResponse": {"Order": [make_order(1, "OPEN"), make_order(2, "OPEN")]}}
+
+        events = self.tracker.poll_account("acc")
+
+        self.client.list_orders.assert_called_once()
+        self.assertEqual([e["type"] for e in events], ["status", "status"])
+        self.assertTrue(all(e["invalidate"] == [] for e in events))
+
+    def test_pages_until_every_tracked_order_is_found(self):
+        self.tracker.register("acc", 1)
+        self.tracker.register("acc", 250)
+        self.client.list_orders.side_effect = [
+            {"OrdersResponse": {"marker": "m1", "Order": [make_order(1, "OPEN"), make_order(7, "OPEN")]}},
+            {"OrdersResponse": {"marker": "m2", "Order": [make_order(250, "EXECUTED")]}},
+            {"OrdersResponse": {"Order": [make_order(300, "OPEN")]}},
+        ]
+
+        events = {e["orderId"]: e for e in self.tracker.poll_account("acc")}
+
+        self.assertEqual(events[250]["type"], "fill")
+        self.assertEqual(self.client.list_orders.call_count, 2)
+
+    def test_fill_and_cancel_events_stop_tracking(self):
+        self.tracker.register("acc", 1, "AAPL")
+        self.tracker.register("acc", 2, "AAPL")
+        self.client.list_orders.return_value = {"OrdersResponse": {"Order": [make_order(1, "EXECUTED"), make_order(2, "CANCELLED")]}}
+
+        events = {e["orderId"]: e for e in self.tracker.poll_account("acc")}
+
+        self.assertEqual(events[1]["type"], "fill")
+        self.assertEqual(events[1]["invalidate"], ["portfolio", "balance"])
+        self.assertEqual(events[2]["type"], "cancel")
+        self.assertEqual(events[2]["invalidate"], [])
+        self.assertEqual(self.tracker.tracked(), [])
+        # Status changes are written to history without marking the account as synced.
+        self.assertEqual(len(self.store.query_orders("acc")), 2)
+        self.assertIsNone(self.store.last_synced("orders", "acc"))
+
+    def test_unchanged_order_emits_nothing(self):
+        self.tracker.register("acc", 1)
+        self.client.list_orders.return_value = {"OrdersResponse": {"Order": [make_order(1, "OPEN")]}}
+
+        self.tracker.poll_account("acc")
+        self.assertEqual(self.tracker.poll_account("acc"), [])
+        self.assertEqual(len(self.tracker.tracked()), 1)
+
+    def test_poll_error_keeps_order_tracked(self):
+        self.tracker.register("acc", 1)
+        self.client.list_orders.side_effect = Exception("throttled")
+
+        self.assertEqual(self.tracker.poll_account("acc"), [])
+        self.assertEqual(len(self.tracker.tracked()), 1)
+
+    def test_events_reach_subscribers(self):
+        self.tracker.register("acc", 1)
+        self.client.list_orders.return_value = {"OrdersResponse": {"Order": [make_order(1, "EXECUTED")]}}
+
+        async def run():
+            queue = self.tracker.subscribe()
+            await asyncio.to_thread(self.tracker.poll_account, "acc")
+            return await asyncio.wait_for(queue.get(), timeout=1)
+
+        event = asyncio.run(run())
+        self.assertEqual(event["type"], "fill")
+
+    def test_store_error_does_not_drop_events(self):
+        self.tracker.register("acc", 1)
+        self.client.list_orders.return_value = {"OrdersResponse": {"Order": [make_order(1, "EXECUTED")]}}
+        self.store.upsert_orders = MagicMock(side_effect=Exception("database is locked"))
+
+        async def run():
+            queue = self.tracker.subscribe()
+            await asyncio.to_thread(self.tracker.poll_account, "acc")
+            return await asyncio.wait_for(queue.get(), timeout=1)
+
+        event = asyncio.run(run())
+        self.assertEqual(event["type"], "fill")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import json
+import os
+import tempfile
+import unittest
+import zlib
+from datetime import date
+from unittest.mock import patch, MagicMock
+
+from api.etrade_auth import ETradeAuth
+from api.etrade_client import ETradeClient
+from api.gemini_client import GeminiClient
+from api.recording import Cassette, CassetteMiss, CorruptCassette, REDACTED
+from tests.helpers import fake_response
+
+class TestRecording(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cassette.jsonl.gz")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    @patch('api.recording.requests.request')
+    def test_record_then_replay_etrade(self, mock_request):
+        mock_request.return_value = fake_response({"AccountListResponse": {"Accounts": {"Account": [{"accountIdKey": "k1"}]}}})
+
+        recorder = ETradeClient('key', 'secret', 'at', 'ats', 'https://api.com', transport=Cassette(self.path, "record").http_transport())
+        recorded = recorder.list_accounts()
+
+        player = ETradeClient('key', 'secret', 'at', 'ats', 'https://other.com', transport=Cassette(self.path, "replay", realtime=False).http_transport())
+        self.assertEqual(player.list_accounts(), recorded)
+        mock_request.assert_called_once()
+
+    @patch('api.recording.requests.request')
+    def test_credentials_are_redacted(self, mock_request):
+        mock_request.return_value = fake_response({"oauth_token": "secret-token", "data": {"api_key": "k"}})
+
+        Cassette(self.path, "record").http_transport().get("https://api.com/x", params={"token": "t", "count": 5})
+
+        replayed = Cassette(self.path, "replay", realtime=False).play("etrade", "GET", "/x", {"token": "other", "count": 5}, None)
+        self.assertEqual(replayed["params"], {"token": REDACTED, "count": 5})
+        self.assertEqual(replayed["response"], {"oauth_token": REDACTED, "data": {"api_key": REDACTED}})
+
+    @patch('api.recording.requests.request')
+    def test_replay_ignores_volatile_fields(self, mock_request):
+        mock_request.return_value = fake_response({"PreviewOrderResponse": {"PreviewIds": [{"previewId": 1}]}})
+        ETradeClient('key', 'secret', 'at', 'ats', 'https://api.com', transport=Cassette(self.path, "record").http_transport()).preview_order('acc', 'AAPL', 'BUY', 1)
+
+        # preview_order generates a new clientOrderId each call.
+        player = ETradeClient('key', 'secret', 'at', 'ats', 'https://api.com', transport=Cassette(self.path, "replay", realtime=False).http_transport())
+        self.assertEqual(player.preview_order('acc', 'AAPL', 'BUY', 1)["PreviewOrderResponse"]["PreviewIds"][0]["previewId"], 1)
+        with self.assertRaises(CassetteMiss):
+            player.preview_order('acc', 'MSFT', 'BUY', 1)
+
+    @patch('api.recording.requests.request')
+    def test_replay_ignores_date_window(self, mock_request):
+        mock_request.return_value = fake_response({"OrdersResponse": {"Order": []}})
+        ETradeClient('key', 'secret', 'at', 'ats', 'https://api.com', transport=Cassette(self.path, "record").http_transport()).list_orders(
+            'acc', from_date=date(2026, 1, 1), to_date=date(2026, 1, 31)
+        )
+
+        # The tracker derives these from date.today(), so a later replay asks for another window.
+        player = ETradeClient('key', 'secret', 'at', 'ats', 'https://api.com', transport=Cassette(self.path, "replay", realtime=False).http_transport())
+        self.assertEqual(player.list_orders('acc', from_date=date(2026, 2, 1), to_date=date(2026, 2, 28)), {"OrdersResponse": {"Order": []}})
+
+    @patch('api.recording.requests.request')
+    def test_recording_session_is_one_gzip_stream(self, mock_request):
+        mock_request.return_value = fake_response({"data": 1})
+        cassette = Cassette(self.path, "record")
+        for i in range(3):
+            cassette.http_transport().get("https://api.com/x", params={"count": i})
+
+        # Readable while the session is still open...
+        self.assertEqual(len(Cassette(self.path, "replay")._interactions), 3)
+
+        # ...and written as a single gzip member once closed.
+        cassette.close()
+        with open(cassette.session_path, "rb") as f:
+            decompressor = zlib.decompressobj(wbits=31)
+            decompressor.decompress(f.read())
+        self.assertTrue(decompressor.eof)
+        self.assertEqual(decompressor.unused_data, b"")
+
+    @patch('api.recording.requests.request')
+    def test_concurrent_and_unclosed_sessions_replay(self, mock_request):
+        mock_request.return_value = fake_response({"data": 1})
+        # Two workers recording at once, one of which dies without closing its
+        # stream, then a restarted worker recording again.
+        first, second = Cassette(self.path, "record"), Cassette(self.path, "record")
+        for i in range(2):
+            first.http_transport().get("https://api.com/x", params={"worker": 1, "n": i})
+            second.http_transport().get("https://api.com/x", params={"worker": 2, "n": i})
+        first.close()
+        Cassette(self.path, "record").http_transport().get("https://api.com/x", params={"worker": 3})
+
+        player = Cassette(self.path, "replay", realtime=False)
+        self.assertEqual(len(player._interactions), 5)
+        self.assertEqual(player.play("etrade", "GET", "/x", {"worker": 2, "n": 1}, None)["response"], {"data": 1})
+
+    def test_corrupt_cassette_raises(self):
+        with open(self.path, "wb") as f:
+            f.write(b"\x1f\x8b\x08\x00not really gzip")
+        with self.assertRaises(CorruptCassette):
+            Cassette(self.path, "replay")
+
+    @patch('google.genai.Client')
+    def test_record_then_replay_gemini(self, mock_genai_client):
+        mock_genai_client.return_value.models.generate_content.return_value = MagicMock(text="Chat result")
+        data = [{'symbol': 'AAPL', 'company': 'Apple Inc', 'quantity': 10}]
+
+        self.assertEqual(GeminiClient('fake_api_key', cassette=Cassette(self.path, "record")).chat(data, "Buy?"), "Chat result")
+        mock_genai_client.reset_mock()
+
+        player = GeminiClient(None, cassette=Cassette(self.path, "replay", realtime=False))
+        self.assertEqual(player.chat(data, "Buy?"), "Chat result")
+        mock_genai_client.assert_not_called()
+
+    @patch('api.etrade_auth.OAuth1Session')
+    def test_auth_skips_oauth_in_replay(self, mock_oauth):
+        open(self.path, "w").close()
+        config_file = os.path.join(self.tmp.name, "config_replay.json")
+        with open(config_file, "w") as f:
+            json.dump({
+                "consumer_key": "ck", "consumer_secret": "cs",
+                "base_url": "https://api.com", "auth_url": "https://auth.com",
+                "recording": {"mode": "replay", "cassette": self.path}
+            }, f)
+
+        auth = ETradeAuth(config_file)
+        auth.get_authorization_url()
+        credentials = auth.get_access_token("anything")
+
+        self.assertEqual(credentials["access_token"], REDACTED)
+        mock_oauth.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
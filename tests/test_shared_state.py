@@ -0,0 +1,42 @@
+import os
+import tempfile
+import unittest
+
+from api.shared_state import SessionStore, secure_directory
+
+class TestSharedState(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_secure_directory_is_created_private(self):
+        path = os.path.join(self.tmp.name, "state")
+        self.assertTrue(secure_directory(path))
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o700)
+
+    def test_open_directory_is_rejected(self):
+        path = os.path.join(self.tmp.name, "state")
+        os.mkdir(path)
+        os.chmod(path, 0o777)
+        self.assertFalse(secure_directory(path))
+
+    def test_symlink_is_rejected(self):
+        target = os.path.join(self.tmp.name, "target")
+        os.mkdir(target, 0o700)
+        link = os.path.join(self.tmp.name, "link")
+        os.symlink(target, link)
+        self.assertFalse(secure_directory(link))
+
+    def test_session_round_trip(self):
+        store = SessionStore(self.tmp.name)
+        self.assertIsNone(store.version())
+
+        version = store.save({"env": "sandbox", "credentials": {"access_token": "at"}})
+        self.assertEqual(store.version(), version)
+        self.assertEqual(store.load()["credentials"], {"access_token": "at"})
+        self.assertEqual(os.stat(store.path).st_mode & 0o777, 0o600)
+
+if __name__ == '__main__':
+    unittest.main()
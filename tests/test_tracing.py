@@ -0,0 +1,100 @@
+import os
+import tempfile
+import time
+import unittest
+
+from api.tracing import Trace, TraceBuffer, SamplingProfiler, span, traced, _NOOP, _current_trace
+
+@traced("work.outer")
+def outer():
+    with span("work.inner", step=1):
+        time.sleep(0.002)
+
+class TestTracing(unittest.TestCase):
+    def test_span_is_noop_without_trace(self):
+        self.assertIs(span("anything"), _NOOP)
+
+    def test_spans_nest_and_export(self):
+        trace = Trace("GET /test")
+        token = _current_trace.set(trace)
+        try:
+            outer()
+        finally:
+            _current_trace.reset(token)
+
+        by_name = {s["name"]: s for s in trace.spans}
+        self.assertEqual(by_name["work.inner"]["parent"], by_name["work.outer"]["id"])
+
+        events = trace.to_chrome()["traceEvents"]
+        self.assertEqual({e["name"] for e in events}, {"work.outer", "work.inner"})
+        self.assertTrue(all(e["ph"] == "X" and e["dur"] >= 0 for e in events))
+        self.assertEqual(next(e for e in events if e["name"] == "work.inner")["args"], {"step": 1})
+
+        folded = dict(line.rsplit(" ", 1) for line in trace.to_folded().splitlines())
+        self.assertIn("work.outer;work.inner", folded)
+        self.assertGreaterEqual(int(folded["work.outer;work.inner"]), 2000)
+
+    def test_sampling_profiler_collects_stacks(self):
+        profiler = SamplingProfiler()
+        self.assertTrue(profiler.start(0.2, interval=0.001))
+        self.assertFalse(profiler.start(0.2))
+
+        deadline = time.monotonic() + 0.3
+        while time.monotonic() < deadline:
+            sum(range(1000))
+        time.sleep(0.05)
+
+        self.assertFalse(profiler.running)
+        self.assertGreater(profiler.samples, 0)
+        self.assertIn("test_tracing.py:test_sampling_profiler_collects_stacks", profiler.folded())
+
+class TestSharedTracing(unittest.TestCase):
+    # Two buffers or profilers on one directory stand in for two worker processes.
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_trace_is_readable_from_another_worker(self):
+        recorder, reader = TraceBuffer(size=2, directory=self.tmp.name), TraceBuffer(size=2, directory=self.tmp.name)
+        trace = Trace("GET /test")
+        token = _current_trace.set(trace)
+        try:
+            outer()
+        finally:
+            _current_trace.reset(token)
+        recorder.add(trace)
+
+        shared = reader.get(trace.id)
+        self.assertEqual(shared.to_chrome(), trace.to_chrome())
+        self.assertEqual([t["id"] for t in reader.list()], [trace.id])
+        self.assertIsNone(reader.get("../../session"))
+
+    def test_shared_traces_are_bounded(self):
+        buffer = TraceBuffer(size=2, directory=self.tmp.name)
+        for _ in range(4):
+            buffer.add(Trace("GET /test"))
+            time.sleep(0.01)
+        self.assertEqual(len(os.listdir(self.tmp.name)), 2)
+
+    def test_profile_run_is_joined_and_merged(self):
+        starter, joiner = SamplingProfiler(self.tmp.name), SamplingProfiler(self.tmp.name)
+        self.assertTrue(starter.start(0.2, interval=0.001))
+        self.assertFalse(joiner.start(0.2))
+        # Checked by the tracing middleware on each request.
+        self.assertTrue(joiner.running)
+
+        deadline = time.monotonic() + 0.3
+        while time.monotonic() < deadline:
+            sum(range(1000))
+        time.sleep(0.05)
+
+        self.assertFalse(starter.in_progress())
+        total = sum(int(line.rsplit(" ", 1)[1]) for line in starter.folded().splitlines())
+        local = sum(int(line.rsplit(" ", 1)[1]) for line in (starter._local_folded() + joiner._local_folded()).splitlines())
+        self.assertGreater(joiner.samples, 0)
+        self.assertEqual(total, local)
+
+if __name__ == '__main__':
+    unittest.main()